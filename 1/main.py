@@ -1,46 +1,69 @@
+import os
 import re
-from typing import Generator, Tuple
+import sys
+from typing import Generator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
 
 START_POSITION = 50
 
+def parse_input(input_file) -> List[Tuple[str, int]]:
+    moves = []
+    for line in input_file.text_lines():
+        line = line.strip()
+        if line:       
+            match = re.match(r'([LR])(\d+)', line)
+            if match:
+                direction = match.group(1)
+                steps = int(match.group(2))
+                moves.append((direction, steps))
+    return moves
+
 def read_input(filename) -> Generator[Tuple[str, int], None, None]:
-    with open(filename, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if line:       
-                match = re.match(r'([LR])(\d+)', line)
-                if match:
-                    direction = match.group(1)
-                    steps = int(match.group(2))
-                    yield (direction, steps)
+    with phase('parse'):
+        moves = cached(filename, parse_input)
+    yield from moves
 
+@instrumented
+@persistent
 def solve_part_1(filename) -> int:
     position = START_POSITION
     zeros = 0
 
-    for direction, steps in read_input(filename):
-        position = position + steps if direction == 'R' else position - steps
-        if position % 100 == 0:
-            zeros += 1
+    moves = list(read_input(filename))
+    count('moves', len(moves))
+    with phase('search'):
+        for direction, steps in moves:
+            position = position + steps if direction == 'R' else position - steps
+            if position % 100 == 0:
+                zeros += 1
 
     return zeros
 
+@instrumented
+@persistent
 def solve_part_2(filename) -> int:
     curr = START_POSITION
     zeros = 0
 
-    for direction, steps in read_input(filename):
-        zeros += steps // 100
-        steps = steps % 100
-        nextp = (curr + steps if direction == 'R' else curr - steps) % 100
-
-        k1 = (nextp > curr and direction == 'L')
-        k2 = (nextp < curr and direction == 'R')
-        
-        if (nextp == 0) or (curr != 0 and (k1 or k2)):
-            zeros += 1
-        
-        curr = nextp
+    moves = list(read_input(filename))
+    count('moves', len(moves))
+    with phase('search'):
+        for direction, steps in moves:
+            zeros += steps // 100
+            steps = steps % 100
+            nextp = (curr + steps if direction == 'R' else curr - steps) % 100
+
+            k1 = (nextp > curr and direction == 'L')
+            k2 = (nextp < curr and direction == 'R')
+            
+            if (nextp == 0) or (curr != 0 and (k1 or k2)):
+                zeros += 1
+            
+            curr = nextp
 
     return zeros
 
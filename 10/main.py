@@ -1,9 +1,22 @@
-import z3
+import os
 import re
+import sys
+from fractions import Fraction
+from functools import lru_cache
+from itertools import product
+from math import lcm, prod
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import memoize_item, persistent
 
 def read(filename):
-    with open(filename) as f:
-        lines = f.readlines()
+    with phase('parse'):
+        return cached(filename, parse)
+
+def parse(input_file):
+    lines = input_file.text_lines()
     
     result = []
     for line in lines:
@@ -36,35 +49,244 @@ def create_masks(switches, target_length):
             masks[i][switches[i][j]] = 1
     return masks
 
-def solve_machine(target, switches, voltage, part):
-    masks = create_masks(switches, len(target))
-    
-    a = [z3.Int(f'a_{i}') for i in range(len(switches))]
-    
-    s = z3.Optimize()
-    
-    if part == 1:
-        for var in a:
-            s.add(z3.Or(var == 0, var == 1))
-        for pos in range(len(target)):
-            total = z3.Sum([a[i] * masks[i][pos] for i in range(len(switches))])
-            s.add(total % 2 == target[pos])
-    else:  # part == 2
+def to_bits(lights):
+    return sum(bit << i for i, bit in enumerate(lights))
+
+def fewest_xors(masks):
+    # Fewest masks (each used at most once) XOR-ing to every reachable value
+    best = {0: 0}
+    for mask in masks:
+        for value, presses in list(best.items()):
+            if best.get(value ^ mask, presses + 2) > presses + 1:
+                best[value ^ mask] = presses + 1
+    return best
+
+@lru_cache(maxsize=4096)
+def fewest_presses(masks, target):
+    # Meet in the middle over integer XOR masks: O(2^(m/2)) per half, joined
+    # on target ^ x. Callers pass the masks sorted, so machines that only
+    # list their switches in another order share a cache entry.
+    count('subset searches')
+    left = fewest_xors(masks[:len(masks) // 2])
+    right = fewest_xors(masks[len(masks) // 2:])
+    joined = [presses + right[value ^ target] for value, presses in left.items() if value ^ target in right]
+    return min(joined) if joined else None
+
+def canonical_machine(target, switches, voltage):
+    # An equivalent machine in a standard form: switch masks deduplicated
+    # and sorted, switches that touch no light dropped, and lights
+    # relabelled in order of their incidence rows until that order settles.
+    # This is not a full canonical form under every light permutation, but
+    # it maps the reorderings seen in inputs to one matrix.
+    num_lights = len(target)
+    masks = sorted({to_bits(mask) for mask in create_masks(switches, num_lights)} - {0})
+    order = list(range(num_lights))
+    for _ in range(num_lights):
+        rows = [sum(1 << k for k, mask in enumerate(masks) if mask >> i & 1) for i in range(num_lights)]
+        perm = sorted(range(num_lights), key=lambda i: rows[i])
+        if perm == list(range(num_lights)):
+            break
+        masks = sorted(sum(1 << j for j in range(num_lights) if mask >> perm[j] & 1) for mask in masks)
+        order = [order[i] for i in perm]
+    return tuple(masks), tuple(target[i] for i in order), tuple(voltage[i] for i in order)
+
+@lru_cache(maxsize=1024)
+def gf2_factor(masks, num_lights):
+    # Gauss-Jordan elimination of the light x switch matrix over GF(2),
+    # keeping the row operations: row r of the reduced matrix has its pivot
+    # at switch pivots[r] and is transforms[r] (a light bitmask) applied to
+    # the original rows. null_basis spans the presses that change nothing.
+    count('factorizations')
+    rows = [sum(1 << k for k, mask in enumerate(masks) if mask >> i & 1) for i in range(num_lights)]
+    transforms = [1 << i for i in range(num_lights)]
+    pivots = []
+    for col in range(len(masks)):
+        r = len(pivots)
+        pivot = next((i for i in range(r, num_lights) if rows[i] >> col & 1), None)
+        if pivot is None:
+            continue
+        rows[r], rows[pivot] = rows[pivot], rows[r]
+        transforms[r], transforms[pivot] = transforms[pivot], transforms[r]
+        for i in range(num_lights):
+            if i != r and rows[i] >> col & 1:
+                rows[i] ^= rows[r]
+                transforms[i] ^= transforms[r]
+        pivots.append(col)
+
+    null_basis = []
+    for col in range(len(masks)):
+        if col not in pivots:
+            presses = 1 << col
+            for row, pivot in zip(rows, pivots):
+                if row >> col & 1:
+                    presses |= 1 << pivot
+            null_basis.append(presses)
+    return tuple(pivots), tuple(transforms), tuple(null_basis)
+
+def fewest_light_presses(masks, num_lights, target):
+    # Back-substitute target through the cached factorization, then take the
+    # lightest of the 2^f solutions. With more free switches than half of
+    # all switches, meeting in the middle is cheaper.
+    pivots, transforms, null_basis = gf2_factor(masks, num_lights)
+    if len(null_basis) > len(masks) // 2:
+        return fewest_presses(masks, target)
+    parity = [(transform & target).bit_count() & 1 for transform in transforms]
+    if any(parity[len(pivots):]):
+        return None
+    presses = sum(1 << col for col, bit in zip(pivots, parity) if bit)
+    best = presses.bit_count()
+    # Gray code order: each step toggles one basis vector
+    for i in range(1, 1 << len(null_basis)):
+        presses ^= null_basis[(i & -i).bit_length() - 1]
+        best = min(best, presses.bit_count())
+    return best
+
+@lru_cache(maxsize=1024)
+def rational_factor(masks, num_lights):
+    # Gauss-Jordan elimination over the rationals with the row operations
+    # kept, scaled back to integers. Each pivot row is (switch, scale,
+    # coeffs, transform): scale * x[switch] = transform . v minus coeffs .
+    # (free switch presses). Zero rows are transforms with transform . v == 0
+    # for any reachable v.
+    count('factorizations')
+    m = len(masks)
+    rows = [
+        [Fraction(mask >> i & 1) for mask in masks] + [Fraction(int(i == j)) for j in range(num_lights)]
+        for i in range(num_lights)
+    ]
+    pivots = []
+    for col in range(m):
+        r = len(pivots)
+        pivot = next((i for i in range(r, num_lights) if rows[i][col]), None)
+        if pivot is None:
+            continue
+        rows[r], rows[pivot] = rows[pivot], rows[r]
+        rows[r] = [value / rows[r][col] for value in rows[r]]
+        for i in range(num_lights):
+            if i != r and rows[i][col]:
+                factor = rows[i][col]
+                rows[i] = [a - factor * b for a, b in zip(rows[i], rows[r])]
+        pivots.append(col)
+
+    def integral(row):
+        scale = lcm(*(value.denominator for value in row))
+        return [int(value * scale) for value in row]
+
+    free = tuple(col for col in range(m) if col not in pivots)
+    pivot_rows = []
+    for row, col in zip(rows, pivots):
+        row = integral(row)
+        pivot_rows.append((col, row[col], tuple(row[f] for f in free), tuple(row[m:])))
+    zero_rows = tuple(tuple(integral(row)[m:]) for row in rows[len(pivots):])
+    return tuple(pivot_rows), zero_rows, free
+
+# Largest number of assignments of all but the last free switch that
+# fewest_joltage_presses tries before a machine is handed to z3
+MAX_FREE_SEARCH = 1 << 12
+
+def free_bounds(masks, voltage, free):
+    # A switch can't be pressed more often than any light it feeds allows
+    return [min(voltage[i] for i in range(len(voltage)) if masks[col] >> i & 1) for col in free]
+
+@lru_cache(maxsize=4096)
+def fewest_joltage_presses(masks, voltage):
+    # Back-substitute voltage through the cached factorization for every
+    # assignment of all but the last free switch. The pivot rows then bound
+    # the last one to an interval, and the total is linear in it, so the
+    # interval is scanned from its cheaper end and the first integral
+    # solution is the best for that assignment.
+    pivot_rows, zero_rows, free = rational_factor(masks, len(voltage))
+    dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+    if any(dot(transform, voltage) for transform in zero_rows):
+        return None
+    rows = [(scale, coeffs, dot(transform, voltage)) for _, scale, coeffs, transform in pivot_rows]
+    bounds = free_bounds(masks, voltage, free)
+    if not free:
+        # A stand-in free switch held at 0 keeps one code path
+        rows = [(scale, (0,), base) for scale, _, base in rows]
+        bounds = [0]
+    *outer_bounds, last_bound = bounds
+
+    # Totals are kept multiplied by scale_lcm so they stay integers:
+    # scale_lcm * total = outer part + weight * (last switch presses).
+    # Divisibility by every scale repeats with period scale_lcm in the last
+    # switch, so no more than that many values need trying.
+    scale_lcm = lcm(*(scale for scale, _, _ in rows))
+    weight = scale_lcm - sum(scale_lcm // scale * coeffs[-1] for scale, coeffs, _ in rows)
+    best = None
+    for values in product(*(range(bound + 1) for bound in outer_bounds)):
+        lo, hi = 0, last_bound
+        rests = []
+        for scale, coeffs, base in rows:
+            # scale * presses = rest - last * t has to be non-negative
+            rest = base - dot(coeffs[:-1], values)
+            last = coeffs[-1]
+            if last > 0:
+                hi = min(hi, rest // last)
+            elif last < 0:
+                lo = max(lo, -(rest // -last))
+            elif rest < 0:
+                hi = -1
+            rests.append(rest)
+        if lo > hi:
+            continue
+        outer = scale_lcm * sum(values) + sum(scale_lcm // scale * rest for (scale, _, _), rest in zip(rows, rests))
+        if weight >= 0:
+            candidates = range(lo, min(hi, lo + scale_lcm - 1) + 1)
+        else:
+            candidates = range(hi, max(lo, hi - scale_lcm + 1) - 1, -1)
+        if best is not None and outer + weight * candidates[0] >= best * scale_lcm:
+            continue
+        for t in candidates:
+            if all((rest - coeffs[-1] * t) % scale == 0 for (scale, coeffs, _), rest in zip(rows, rests)):
+                best = (outer + weight * t) // scale_lcm
+                break
+    return best
+
+def solve_joltage_z3(masks, voltage):
+    import z3
+    with phase('build'):
+        a = [z3.Int(f'a_{i}') for i in range(len(masks))]
+        
+        s = z3.Optimize()
+        
         for var in a:
             s.add(var >= 0)
-        for pos in range(len(target)):
-            total = z3.Sum([a[i] * masks[i][pos] for i in range(len(switches))])
+        for pos in range(len(voltage)):
+            total = z3.Sum([a[i] * (masks[i] >> pos & 1) for i in range(len(masks))])
             s.add(total == voltage[pos])
-    
-    s.minimize(z3.Sum(a))
-    if s.check() == z3.sat:
-        model = s.model()
-        solution = [model.evaluate(a[i]).as_long() for i in range(len(switches))]
-        return sum(solution)
+        
+        s.minimize(z3.Sum(a))
+    count('models built')
+    with phase('search'):
+        status = s.check()
+    if status != z3.sat:
+        return None
+    model = s.model()
+    return sum(model.evaluate(var).as_long() for var in a)
+
+@memoize_item
+def solve_machine(target, switches, voltage, part):
+    # Machines are solved in canonical form, so ones sharing a switch matrix
+    # share its cached factorization and only back-substitute their target
+    masks, target, voltage = canonical_machine(target, switches, voltage)
+    if part == 1:
+        with phase('search'):
+            presses = fewest_light_presses(masks, len(target), to_bits(target))
     else:
+        _, _, free = rational_factor(masks, len(voltage))
+        if prod(bound + 1 for bound in free_bounds(masks, voltage, free)[:-1]) <= MAX_FREE_SEARCH:
+            with phase('search'):
+                presses = fewest_joltage_presses(masks, voltage)
+        else:
+            presses = solve_joltage_z3(masks, voltage)
+    if presses is None:
         print("No solution found")
         return 0
+    return presses
 
+@instrumented
+@persistent
 def solve(filename, part):
     machines = read(filename)
 
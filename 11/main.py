@@ -1,36 +1,83 @@
+import os
 import re
+import sys
 
-def read(filename):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
+
+def parse(input_file):
     G = {}
-    with open(filename, 'r') as f:
-        for line in f:
-            if match := re.match(r'(\w+):\s*(.*)', line.strip()):
-                source, dests = match.groups()
-                G[source] = dests.split() if dests else []
+    for line in input_file.text_lines():
+        if match := re.match(r'(\w+):\s*(.*)', line.strip()):
+            source, dests = match.groups()
+            G[source] = dests.split() if dests else []
     return G
 
-def count_paths(G, start, end, check_nodes=None):
-    check_nodes = check_nodes or set()
-    memo = {}
-    
-    def dfs(node, visited_nodes, visited_set):
-        if node == end:
-            return 1 if check_nodes <= visited_nodes else 0
-        key = (node, frozenset(visited_nodes))
-        if key in memo:
-            return memo[key]
-        total_paths = 0
-        for neighbor in G.get(node, []):
-            if neighbor not in visited_set:
-                new_visited_nodes = visited_nodes | {neighbor} if neighbor in check_nodes else visited_nodes
-                total_paths += dfs(neighbor, new_visited_nodes, visited_set | {neighbor})
-        memo[key] = total_paths
-        return total_paths
-    
-    return dfs(start, {start} & check_nodes, {start})
-
-def solve(filename, start, end, passing=None):
-    return count_paths(read(filename), start, end, passing)
+def read(filename):
+    with phase('parse'):
+        return cached(filename, parse)
+
+def topological_order(G, start, end, avoid_nodes):
+    # Post-order of the nodes reachable from start, never leaving end or
+    # entering an avoided node, so every node comes after its successors
+    order = []
+    state = {start: 'open'}
+    stack = [(start, iter(G.get(start, []) if start != end else []))]
+    while stack:
+        node, neighbors = stack[-1]
+        for neighbor in neighbors:
+            if neighbor in avoid_nodes:
+                continue
+            if neighbor not in state:
+                state[neighbor] = 'open'
+                stack.append((neighbor, iter(G.get(neighbor, []) if neighbor != end else [])))
+                break
+            if state[neighbor] == 'open':
+                raise ValueError(f"Cycle through {neighbor} reachable from {start}")
+        else:
+            stack.pop()
+            state[node] = 'done'
+            order.append(node)
+    return order
+
+def count_paths(G, start, end, check_nodes=None, avoid_nodes=None):
+    # dp[node_id][mask] = paths from node to end, given the waypoints in mask
+    # (including node itself) have already been visited
+    check_nodes = list(check_nodes or [])
+    avoid_nodes = set(avoid_nodes or [])
+    if start in avoid_nodes or end in avoid_nodes:
+        return 0
+
+    with phase('precompute'):
+        order = topological_order(G, start, end, avoid_nodes)
+    node_id = {node: i for i, node in enumerate(order)}
+    bit = {node: 1 << i for i, node in enumerate(check_nodes)}
+    full = (1 << len(check_nodes)) - 1
+    count('dp states', len(order) * (full + 1))
+
+    with phase('search'):
+        dp = [[0] * (full + 1) for _ in order]
+        for node in order:
+            row = dp[node_id[node]]
+            if node == end:
+                row[full] = 1
+                continue
+            for neighbor in G.get(node, []):
+                if neighbor in avoid_nodes:
+                    continue
+                next_row = dp[node_id[neighbor]]
+                neighbor_bit = bit.get(neighbor, 0)
+                for mask in range(full + 1):
+                    row[mask] += next_row[mask | neighbor_bit]
+
+    return dp[node_id[start]][bit.get(start, 0)]
+
+@instrumented
+@persistent
+def solve(filename, start, end, passing=None, avoiding=None):
+    return count_paths(read(filename), start, end, passing, avoiding)
 
 if __name__ == "__main__":
     print(solve('sample1.in', 'you', 'out'))
@@ -1,15 +1,18 @@
+import os
 import re
+import sys
 import math
 from collections import defaultdict
-from ortools.sat.python import cp_model
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.animation import FuncAnimation
-import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from shapes import get_dihedral_cells
 
 def read(filename):
-    with open(filename) as f:
-        lines = [line.rstrip('\n') for line in f]
+    return cached(filename, parse)
+
+def parse(input_file):
+    lines = input_file.text_lines()
     
     # Parse shapes
     shapes = []
@@ -46,66 +49,6 @@ def read(filename):
     
     return shapes, grids
 
-def dihedral(shape):
-    results = []
-    current = shape
-    
-    # Generate 4 rotations
-    for _ in range(4):
-        results.append(current)
-        # Rotate 90 degrees clockwise
-        current = [''.join(current[len(current)-1-j][i] for j in range(len(current))) 
-                   for i in range(len(current[0]))]
-    
-    # Flip horizontally and generate 4 more rotations
-    flipped = [row[::-1] for row in shape]
-    current = flipped
-    for _ in range(4):
-        results.append(current)
-        # Rotate 90 degrees clockwise
-        current = [''.join(current[len(current)-1-j][i] for j in range(len(current))) 
-                   for i in range(len(current[0]))]
-    
-    # Remove duplicates while preserving order
-    unique = []
-    seen = set()
-    for r in results:
-        key = tuple(r)
-        if key not in seen:
-            seen.add(key)
-            unique.append(r)
-    
-    return unique
-
-def shape_to_cells(shape):
-    cells = set()
-    for r, row in enumerate(shape):
-        for c, ch in enumerate(row):
-            if ch == '#':
-                cells.add((r, c))
-    return cells
-
-
-def normalize_cells(cells):
-    if not cells:
-        return frozenset()
-    min_r = min(r for r, c in cells)
-    min_c = min(c for r, c in cells)
-    return frozenset((r - min_r, c - min_c) for r, c in cells)
-
-
-def get_dihedral_cells(shape):
-    variations = dihedral(shape)
-    unique_cells = []
-    seen = set()
-    for var in variations:
-        cells = normalize_cells(shape_to_cells(var))
-        if cells not in seen:
-            seen.add(cells)
-            unique_cells.append(cells)
-    return unique_cells
-
-
 def get_valid_placements(cells, width, height):
     placements = []
     for anchor_r in range(height):
@@ -122,6 +65,8 @@ def get_valid_placements(cells, width, height):
     return placements
 
 def solve_ortools(width, height, counts, shape_variations, display=False, line_number=0):
+    from ortools.sat.python import cp_model
+    
     model = cp_model.CpModel()
     
     # placement_vars[shape_idx] = list of (BoolVar, var_idx, anchor_r, anchor_c) tuples
@@ -238,6 +183,9 @@ def compute_edges_for_cells(cells_set):
 
 def create_animation(width, height, counts, shape_variations, placements, line_number):
     """Create an MP4 animation showing shapes moving into their final positions."""
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from matplotlib.animation import FuncAnimation
     
     # Color palette - vibrant and distinct colors
     colors = [
@@ -1,10 +1,26 @@
+import importlib.util
+import os
 import re
-from collections import defaultdict
-from ortools.sat.python import cp_model
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache, reduce
+from itertools import product
+from operator import or_
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import collected, count, instrumented, merge, phase
+from resultcache import default_cache, item_key
+from shapes import get_dihedral_cells
 
 def read(filename):
-    with open(filename) as f:
-        lines = [line.rstrip('\n') for line in f]
+    with phase('parse'):
+        return cached(filename, parse)
+
+def parse(input_file):
+    lines = input_file.text_lines()
     
     # Parse shapes
     shapes = []
@@ -41,83 +57,19 @@ def read(filename):
     
     return shapes, grids
 
-def dihedral(shape):
-    results = []
-    current = shape
-    
-    # Generate 4 rotations
-    for _ in range(4):
-        results.append(current)
-        # Rotate 90 degrees clockwise
-        current = [''.join(current[len(current)-1-j][i] for j in range(len(current))) 
-                   for i in range(len(current[0]))]
-    
-    # Flip horizontally and generate 4 more rotations
-    flipped = [row[::-1] for row in shape]
-    current = flipped
-    for _ in range(4):
-        results.append(current)
-        # Rotate 90 degrees clockwise
-        current = [''.join(current[len(current)-1-j][i] for j in range(len(current))) 
-                   for i in range(len(current[0]))]
-    
-    # Remove duplicates while preserving order
-    unique = []
-    seen = set()
-    for r in results:
-        key = tuple(r)
-        if key not in seen:
-            seen.add(key)
-            unique.append(r)
-    
-    return unique
-
-def shape_to_cells(shape):
-    cells = set()
-    for r, row in enumerate(shape):
-        for c, ch in enumerate(row):
-            if ch == '#':
-                cells.add((r, c))
-    return cells
-
-
-def normalize_cells(cells):
-    if not cells:
-        return frozenset()
-    min_r = min(r for r, c in cells)
-    min_c = min(c for r, c in cells)
-    return frozenset((r - min_r, c - min_c) for r, c in cells)
-
-
-def get_dihedral_cells(shape):
-    variations = dihedral(shape)
-    unique_cells = []
-    seen = set()
-    for var in variations:
-        cells = normalize_cells(shape_to_cells(var))
-        if cells not in seen:
-            seen.add(cells)
-            unique_cells.append(cells)
-    return unique_cells
+@lru_cache(maxsize=None)
+def get_valid_placements(cells, width, height):
+    # Cells are normalized to start at (0, 0), so the valid anchors are just
+    # the range product that keeps the bounding box inside the grid
+    max_r = max(r for r, c in cells)
+    max_c = max(c for r, c in cells)
+    return tuple(product(range(height - max_r), range(width - max_c)))
 
 
-def get_valid_placements(cells, width, height):
-    placements = []
-    for anchor_r in range(height):
-        for anchor_c in range(width):
-            # Check if all cells fit within bounds
-            valid = True
-            for dr, dc in cells:
-                r, c = anchor_r + dr, anchor_c + dc
-                if r < 0 or r >= height or c < 0 or c >= width:
-                    valid = False
-                    break
-            if valid:
-                placements.append((anchor_r, anchor_c))
-    return placements
-
-
-def solve_ortools(width, height, counts, shape_variations):
+def build_model(width, height, shape_variations):
+    from ortools.sat.python import cp_model
+    
+    count('models built')
     model = cp_model.CpModel()
     
     # placement_vars[shape_idx] = list of BoolVar for all valid placements of that shape
@@ -134,70 +86,363 @@ def solve_ortools(width, height, counts, shape_variations):
             for anchor_r, anchor_c in valid_positions:
                 # Create boolean variable for this placement
                 var = model.NewBoolVar(f"p_{shape_idx}_{var_idx}_{anchor_r}_{anchor_c}")
-                
-                # Calculate actual cells covered
-                covered = frozenset((anchor_r + dr, anchor_c + dc) for dr, dc in cells)
                 shape_placements.append(var)
                 
                 # Register this placement for each cell it covers
-                for cell in covered:
-                    cell_to_placements[cell].append(var)
+                for dr, dc in cells:
+                    cell_to_placements[(anchor_r + dr, anchor_c + dc)].append(var)
         
         placement_vars.append(shape_placements)
     
-    # Constraint 1: Exactly counts[i] placements for each shape type
-    for shape_idx, count in enumerate(counts):
-        vars_for_shape = placement_vars[shape_idx]
-        if count > 0:
-            if len(vars_for_shape) < count:
-                # Not enough valid placements possible
-                return False
-            model.Add(sum(vars_for_shape) == count)
-        else:
-            # No placements allowed for this shape
-            for v in vars_for_shape:
-                model.Add(v == 0)
+    # Constraint 1: Number of placements of each shape type equals its count
+    # variable, whose domain is pinned per region in solve_ortools
+    count_vars = []
+    for shape_idx, vars_for_shape in enumerate(placement_vars):
+        count_var = model.NewIntVar(0, len(vars_for_shape), f"count_{shape_idx}")
+        model.Add(sum(vars_for_shape) == count_var)
+        count_vars.append((count_var, len(vars_for_shape)))
     
     # Constraint 2: Each cell can be covered by at most one placement
     for cell, vars_covering in cell_to_placements.items():
         if len(vars_covering) > 1:
             model.AddAtMostOne(vars_covering)
     
+    return model, count_vars
+
+
+def solve_ortools(width, height, counts, shape_variations, models=None, num_workers=None, time_limit=None):
+    # Returns True/False, or None (UNKNOWN) when time_limit runs out first.
+    from ortools.sat.python import cp_model
+    
+    # Models only depend on the grid size and the shapes, so regions with
+    # the same dimensions share one skeleton and only swap their count
+    # domains. The shapes are part of the key since models outlives one
+    # input in a pool worker.
+    models = {} if models is None else models
+    key = (width, height, tuple((shape_id, tuple(variations)) for shape_id, variations in shape_variations))
+    if key not in models:
+        with phase('build'):
+            models[key] = build_model(width, height, shape_variations)
+    model, count_vars = models[key]
+    
+    for shape_idx, (count_var, num_placements) in enumerate(count_vars):
+        if shape_idx < len(counts):
+            low = high = counts[shape_idx]
+            if low > num_placements:
+                # Not enough valid placements possible
+                return False
+        else:
+            low, high = 0, num_placements
+        domain = model.Proto().variables[count_var.Index()].domain
+        domain[0], domain[1] = low, high
+    
     solver = cp_model.CpSolver()
-    solver.parameters.num_search_workers = 14  # Use multiple threads
-    status = solver.Solve(model)
+    solver.parameters.num_search_workers = num_workers or os.cpu_count() or 1
+    if time_limit is not None:
+        solver.parameters.max_time_in_seconds = time_limit
+    with phase('search'):
+        status = solver.Solve(model)
     
+    if status == cp_model.UNKNOWN:
+        return None
     return status == cp_model.FEASIBLE or status == cp_model.OPTIMAL
 
 
-def solve(filename):
-    shapes, grids = read(filename)
+def placement_masks(width, height, shape_variations):
+    # by_cell[shape_idx][cell] = placements whose first (row-major) cell is
+    # cell, each as (bitmask over the region, var_idx, anchor_r, anchor_c)
+    by_cell = []
+    for shape_id, variations in shape_variations:
+        shape_by_cell = [[] for _ in range(width * height)]
+        for var_idx, cells in enumerate(variations):
+            for anchor_r, anchor_c in get_valid_placements(cells, width, height):
+                mask = 0
+                for dr, dc in cells:
+                    mask |= 1 << ((anchor_r + dr) * width + anchor_c + dc)
+                first = (mask & -mask).bit_length() - 1
+                shape_by_cell[first].append((mask, var_idx, anchor_r, anchor_c))
+        by_cell.append(shape_by_cell)
+    return by_cell
+
+
+def pack(width, height, counts, shape_variations, time_limit=None, max_dead_states=1 << 20):
+    # Pure-Python bitboard packer. Backtracks on the first empty cell: either
+    # a piece starts there or the cell stays empty, as long as there are spare
+    # cells left. Pieces are chosen by type with a remaining count, so
+    # identical pieces are never permuted. Returns a list of
+    # (shape_idx, var_idx, anchor_r, anchor_c), False if there is no packing,
+    # or None (UNKNOWN) when time_limit runs out first.
+    counts = tuple(counts) + (0,) * (len(shape_variations) - len(counts))
+    areas = [len(variations[0]) for shape_id, variations in shape_variations]
+    slack = width * height - sum(count * area for count, area in zip(counts, areas))
+    if slack < 0:
+        return False
+    if not any(counts):
+        return []
     
-    # Precompute all dihedral variations for each shape as cell sets
-    shape_variations = []
-    for shape_id, shape_lines in shapes:
-        variations = get_dihedral_cells(shape_lines)
-        shape_variations.append((shape_id, variations))
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    by_cell = placement_masks(width, height, shape_variations)
     
-    results = []
-    for line_number, grid_spec in enumerate(grids):
-        width, height, counts = grid_spec
+    def moves(filled, remaining, slack):
+        # (filled, remaining, slack, placement or None) after each choice
+        cell = ((filled + 1) & ~filled).bit_length() - 1
+        for shape_idx, count in enumerate(remaining):
+            if count == 0:
+                continue
+            next_remaining = remaining[:shape_idx] + (count - 1,) + remaining[shape_idx + 1:]
+            for mask, var_idx, anchor_r, anchor_c in by_cell[shape_idx][cell]:
+                if mask & filled == 0:
+                    yield filled | mask, next_remaining, slack, (shape_idx, var_idx, anchor_r, anchor_c)
+        
+        # Leave the cell empty
+        if slack > 0:
+            yield filled | (1 << cell), remaining, slack - 1, None
+    
+    # Depth-first with an explicit stack, since depth grows with the region.
+    # path[i] is the choice that led to stack[i + 1].
+    dead = set()
+    stack = [((0, counts), moves(0, counts, slack))]
+    path = []
+    nodes = 0
+    while stack:
+        nodes += 1
+        if deadline is not None and nodes % 1024 == 0 and time.perf_counter() > deadline:
+            return None
         
-        # Quick area check
-        total_area = sum(
-            counts[i] * len(shape_variations[i][1][0]) 
-            for i in range(len(counts))
-        )
-        if total_area > width * height:
-            print(f"Line {line_number}/{len(grids)}: False")
-            results.append(False)
+        key, options = stack[-1]
+        move = next(options, None)
+        if move is None:
+            # Every choice from this state failed
+            stack.pop()
+            if path:
+                path.pop()
+            if len(dead) < max_dead_states:
+                dead.add(key)
             continue
         
-        result = solve_ortools(width, height, counts, shape_variations)
-        print(f"Line {line_number}/{len(grids)}: {result}")
+        filled, remaining, next_slack, choice = move
+        if not any(remaining):
+            return [placement for placement in path + [choice] if placement is not None]
+        if (filled, remaining) in dead:
+            continue
+        path.append(choice)
+        stack.append(((filled, remaining), moves(filled, remaining, next_slack)))
+    return False
+
+
+# Regions up to this many cells go to the bitboard packer instead of CP-SAT,
+# and so does everything when OR-Tools isn't installed
+PACKER_MAX_CELLS = 48
+HAVE_ORTOOLS = importlib.util.find_spec('ortools') is not None
+
+# Per-process model cache for pool workers, keyed by grid size and shapes
+MODELS = {}
+
+
+def route_region(width, height, counts, shape_variations, num_workers, time_limit):
+    if width * height <= PACKER_MAX_CELLS or not HAVE_ORTOOLS:
+        with phase('search'):
+            packing = pack(width, height, counts, shape_variations, time_limit)
+        return 'packer', None if packing is None else packing is not False
+    return 'solver', solve_ortools(width, height, counts, shape_variations, MODELS, num_workers, time_limit)
+
+
+def solve_region(width, height, counts, shape_variations, num_workers, time_limit):
+    # Runs in pool workers, so the worker's phases and counters come back
+    # with (engine, result) for merge() in the parent
+    (engine, result), stats = collected(
+        route_region, width, height, counts, shape_variations, num_workers, time_limit
+    )
+    return engine, result, stats
+
+
+def benchmark(filename, repeat=3):
+    # Time the packer against CP-SAT on every region small enough to route
+    shapes, grids = read(filename)
+    shape_variations = [(shape_id, get_dihedral_cells(shape_lines)) for shape_id, shape_lines in shapes]
+    
+    for line_number, (width, height, counts) in enumerate(grids):
+        if width * height > PACKER_MAX_CELLS:
+            continue
+        timings = {}
+        for name, engine in [
+            ('packer', lambda: pack(width, height, counts, shape_variations) is not False),
+            ('cp-sat', lambda: solve_ortools(width, height, counts, shape_variations)),
+        ]:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                result = engine()
+            timings[name] = ((time.perf_counter() - start) / repeat, result)
+        print(f"Line {line_number} ({width}x{height}): " + ", ".join(
+            f"{name} {elapsed * 1000:.1f} ms -> {result}" for name, (elapsed, result) in timings.items()
+        ))
+
+
+def search_workers(width, height, cores, processes):
+    # Small regions solve fastest single-threaded; larger ones get an even
+    # share of the cores left over by the process pool
+    if width * height <= 100:
+        return 1
+    return max(1, cores // processes)
+
+
+COLORINGS = {
+    'checkerboard': lambda r, c: (r + c) % 2,
+    'rows': lambda r, c: r % 2,
+    'columns': lambda r, c: c % 2,
+}
+
+
+def fits_in_boxes(width, height, counts, shape_variations):
+    # Sufficient: every piece gets its own disjoint bounding box, so no
+    # interlocking is needed
+    used = [shape_variations[i][1][0] for i in range(len(counts)) if counts[i] > 0]
+    if not used:
+        return True
+    box_h = max(max(r for r, c in cells) + 1 for cells in used)
+    box_w = max(max(c for r, c in cells) + 1 for cells in used)
+    boxes = max((height // box_h) * (width // box_w), (height // box_w) * (width // box_h))
+    return sum(counts) <= boxes
+
+
+def coloring_feasible(width, height, counts, shape_variations, color):
+    # Necessary: under a 2-coloring of the grid, each placement covers one of
+    # a few possible numbers of color-1 cells. Some choice per piece has to
+    # fit within both color classes of the grid.
+    grid_ones = sum(color(r, c) for r in range(height) for c in range(width))
+    grid_zeros = width * height - grid_ones
+    
+    total_cells = 0
+    reachable = 1  # Bitset of achievable color-1 totals
+    for shape_idx, count in enumerate(counts):
+        variations = shape_variations[shape_idx][1]
+        options = {
+            sum(color(ar + dr, ac + dc) for dr, dc in cells)
+            for cells in variations
+            for ar in range(2)
+            for ac in range(2)
+        }
+        for _ in range(count):
+            reachable = reduce(or_, (reachable << k for k in options))
+        total_cells += count * len(variations[0])
+    
+    low = max(0, total_cells - grid_zeros)
+    if low > grid_ones:
+        return False
+    window = ((1 << (grid_ones - low + 1)) - 1) << low
+    return bool(reachable & window)
+
+
+def precheck(width, height, counts, shape_variations):
+    # Tiered feasibility filter, cheapest first. Returns (tier, result), or
+    # (None, None) when the region has to go to the solver.
+    if fits_in_boxes(width, height, counts, shape_variations):
+        return 'boxes', True
+    
+    # Quick area check
+    total_area = sum(
+        counts[i] * len(shape_variations[i][1][0]) 
+        for i in range(len(counts))
+    )
+    if total_area > width * height:
+        return 'area', False
+    
+    for name, color in COLORINGS.items():
+        if not coloring_feasible(width, height, counts, shape_variations, color):
+            return name, False
+    
+    return None, None
+
+
+@instrumented
+def solve(filename, processes=None, time_limit=None):
+    # time_limit (seconds per region) is opt-in. Regions that run out of it
+    # are reported as UNKNOWN and make solve() raise rather than return a
+    # count that treats them as not fitting.
+    shapes, grids = read(filename)
+    
+    # Precompute all dihedral variations for each shape as cell sets
+    with phase('precompute'):
+        shape_variations = []
+        for shape_id, shape_lines in shapes:
+            variations = get_dihedral_cells(shape_lines)
+            shape_variations.append((shape_id, variations))
+    
+    # Region results persist across runs, keyed by the region and shapes,
+    # so a partially changed input only re-solves the regions that changed.
+    # This is the only result cache here: a whole-input total would also
+    # keep answers that counted UNKNOWN regions as not fitting.
+    stored = default_cache()
+    
+    cores = os.cpu_count() or 1
+    processes = processes or cores
+    
+    # Shapes come with all their dihedral variations, so a region and its
+    # transpose share one signature
+    known = {}
+    # signature -> line numbers waiting on an in-flight solve
+    waiting = {}
+    tier_hits = Counter()
+    results = []
+    
+    def report(line_number, tier, result):
+        tier_hits[tier] += 1
+        count(f'regions via {tier}')
+        print(f"Line {line_number}/{len(grids)}: {'UNKNOWN' if result is None else result}")
         results.append(result)
     
-    return sum([1 for result in results if result])
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {}
+        for line_number, grid_spec in enumerate(grids):
+            width, height, counts = grid_spec
+            signature = (min(width, height), max(width, height), tuple(counts))
+            
+            if signature in known:
+                report(line_number, 'cache', known[signature])
+                continue
+            if signature in waiting:
+                waiting[signature].append(line_number)
+                continue
+            
+            region_key = item_key(solve_region, width, height, counts, shape_variations)
+            hit, result = stored.get(region_key)
+            if hit:
+                known[signature] = result
+                report(line_number, 'stored', result)
+                continue
+            
+            with phase('precheck'):
+                tier, result = precheck(width, height, counts, shape_variations)
+            if tier is not None:
+                known[signature] = result
+                report(line_number, tier, result)
+                continue
+            
+            num_workers = search_workers(width, height, cores, processes)
+            future = pool.submit(solve_region, width, height, counts, shape_variations, num_workers, time_limit)
+            futures[future] = (signature, region_key)
+            waiting[signature] = [line_number]
+        
+        # Stream results in completion order
+        with phase('reduce'):
+            for future in as_completed(futures):
+                signature, region_key = futures[future]
+                engine, result, stats = future.result()
+                merge(stats)
+                if result is not None:
+                    known[signature] = result
+                    stored.put(region_key, result)
+                first, *duplicates = waiting.pop(signature)
+                report(first, engine, result)
+                for line_number in duplicates:
+                    report(line_number, 'cache', result)
+    
+    print(f"Tier hits: {dict(tier_hits)}")
+    fits = sum([1 for result in results if result])
+    unknown = results.count(None)
+    if unknown:
+        raise TimeoutError(f"{unknown} regions UNKNOWN after {time_limit}s each; {fits} known to fit")
+    return fits
 
 
 if __name__ == "__main__":
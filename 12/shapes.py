@@ -0,0 +1,49 @@
+# Integer coordinate maps for the 8 dihedral transforms, in the order
+# rotations first, then rotations of the horizontally flipped shape
+TRANSFORMS = [
+    lambda r, c: (r, c),
+    lambda r, c: (c, -r),
+    lambda r, c: (-r, -c),
+    lambda r, c: (-c, r),
+    lambda r, c: (r, -c),
+    lambda r, c: (-c, -r),
+    lambda r, c: (-r, c),
+    lambda r, c: (c, r),
+]
+
+# canonical shape key -> tuple of unique orientations, shared by every
+# module in the process
+_cache = {}
+
+
+def shape_key(shape):
+    # Canonical hash of a shape: its normalized, sorted cells, so padding
+    # and trailing whitespace in the input don't matter
+    cells = [(r, c) for r, row in enumerate(shape) for c, ch in enumerate(row) if ch == '#']
+    return normalize(cells)
+
+
+def normalize(cells):
+    if not cells:
+        return ()
+    min_r = min(r for r, c in cells)
+    min_c = min(c for r, c in cells)
+    return tuple(sorted((r - min_r, c - min_c) for r, c in cells))
+
+
+def orientations(shape):
+    # Unique orientations as sorted (r, c) cell tuples normalized to start
+    # at (0, 0)
+    key = shape_key(shape)
+    if key not in _cache:
+        unique = []
+        for transform in TRANSFORMS:
+            cells = normalize([transform(r, c) for r, c in key])
+            if cells not in unique:
+                unique.append(cells)
+        _cache[key] = tuple(unique)
+    return _cache[key]
+
+
+def get_dihedral_cells(shape):
+    return list(orientations(shape))
@@ -1,16 +1,23 @@
-from typing import List, Tuple
+import os
+import sys
+from bisect import bisect_right
+from typing import Callable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
+
+
+def parse_input(input_file) -> List[Tuple[int, int]]:
+    # "a-b,c-d,..." on the first line
+    fields = input_file.ints(0, signed=False)
+    return list(zip(fields[0::2], fields[1::2]))
 
 
 def read_input(filename: str) -> List[Tuple[int, int]]:
-    with open(filename, 'r') as f:
-        line = f.readline().strip()
-    
-    intervals = []
-    for interval in line.split(','):
-        a, b = interval.split('-')
-        intervals.append((int(a), int(b)))
-    
-    return intervals
+    with phase('parse'):
+        return cached(filename, parse_input)
 
 def is_invalid_id_1(id: str) -> bool:
     if len(id) % 2 != 0:
@@ -28,22 +35,132 @@ def is_invalid_id_2(id: str) -> bool:
     return False
 
 
-def solve_part_1(filename: str) -> int:
-    sum_ids = 0
-    for a, b in read_input(filename):
-        for x in range(a, b + 1):
-            if is_invalid_id_1(str(x)):
-                sum_ids += x
-    return sum_ids
+POWERS = [10 ** n for n in range(40)]
+
+
+def num_digits(x: int) -> int:
+    return bisect_right(POWERS, x) if x > 0 else 1
+
+
+class RepeatedPattern:
+    # IDs made of a k-digit block repeated between min_repeats and
+    # max_repeats times, tested without strings: an n-digit x is such an ID
+    # iff it is a multiple of the repunit-style (10^n - 1) / (10^k - 1) with
+    # a k-digit quotient (the block itself)
+
+    def __init__(self, min_repeats: int = 2, max_repeats: Optional[int] = None):
+        self.min_repeats = min_repeats
+        self.max_repeats = max_repeats
+        self._multipliers = {}
+
+    def multipliers(self, n: int) -> List[Tuple[int, int, int]]:
+        # (multiplier, lowest block, highest block) for every valid block length
+        if n not in self._multipliers:
+            self._multipliers[n] = [
+                ((POWERS[n] - 1) // (POWERS[k] - 1), POWERS[k - 1], POWERS[k] - 1)
+                for k in range(1, n + 1)
+                if n % k == 0
+                and n // k >= self.min_repeats
+                and (self.max_repeats is None or n // k <= self.max_repeats)
+            ]
+        return self._multipliers[n]
+
+    def matches(self, x: int) -> bool:
+        for multiplier, lo, hi in self.multipliers(num_digits(x)):
+            block, rest = divmod(x, multiplier)
+            if rest == 0 and lo <= block <= hi:
+                return True
+        return False
+
+    def __call__(self, id: str) -> bool:
+        return self.matches(int(id))
+
+    def mask(self, values):
+        # Vectorized matches() over a NumPy int64 array
+        import numpy as np
+        mask = np.zeros(len(values), dtype=bool)
+        for n in range(num_digits(int(values.min())), num_digits(int(values.max())) + 1):
+            has_n_digits = (values >= POWERS[n - 1]) & (values < POWERS[n])
+            for multiplier, lo, hi in self.multipliers(n):
+                block, rest = np.divmod(values, multiplier)
+                mask |= has_n_digits & (rest == 0) & (block >= lo) & (block <= hi)
+        return mask
+
+    def sum_range(self, a: int, b: int, block_size: int = 1 << 20) -> int:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is None or b >= POWERS[18]:
+            # No NumPy, or IDs past int64
+            return sum(x for x in range(a, b + 1) if self.matches(x))
+        total = 0
+        for lo in range(a, b + 1, block_size):
+            values = np.arange(lo, min(lo + block_size, b + 1), dtype=np.int64)
+            total += sum(values[self.mask(values)].tolist())
+        return total
+
+
+def sum_invalid(a: int, b: int, predicate: Callable[[str], bool]) -> int:
+    # Predicates with a vectorized sum_range (RepeatedPattern) use it
+    if hasattr(predicate, 'sum_range'):
+        return predicate.sum_range(a, b)
+    return sum(x for x in range(a, b + 1) if predicate(str(x)))
+
+
+def split_ranges(intervals: List[Tuple[int, int]], num_chunks: int) -> List[Tuple[int, int, int]]:
+    # Cut every range into sub-ranges of about the same number of IDs,
+    # as (range index, lo, hi), so chunks balance across workers
+    total = sum(b - a + 1 for a, b in intervals)
+    chunk_size = max(1, -(-total // num_chunks))
+    chunks = []
+    for index, (a, b) in enumerate(intervals):
+        for lo in range(a, b + 1, chunk_size):
+            chunks.append((index, lo, min(lo + chunk_size - 1, b)))
+    return chunks
+
+
+def scan_ranges(intervals: List[Tuple[int, int]], predicate: Callable[[str], bool],
+                processes: Optional[int] = None, chunks_per_process: int = 4) -> List[int]:
+    # Sum of the IDs in each range that match predicate. predicate takes the
+    # ID as a string and has to be picklable (a module-level function) when
+    # processes != 1.
+    count('ids checked', sum(b - a + 1 for a, b in intervals))
+    if processes == 1:
+        return [sum_invalid(a, b, predicate) for a, b in intervals]
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    processes = processes or os.cpu_count() or 1
+    sums = [0] * len(intervals)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {
+            pool.submit(sum_invalid, lo, hi, predicate): index
+            for index, lo, hi in split_ranges(intervals, processes * chunks_per_process)
+        }
+        for future in as_completed(futures):
+            sums[futures[future]] += future.result()
+    return sums
+
+
+def scan(filename: str, predicate: Callable[[str], bool], processes: Optional[int] = None) -> int:
+    # For ad-hoc audits with predicates that have no closed form
+    intervals = read_input(filename)
+    with phase('search'):
+        return sum(scan_ranges(intervals, predicate, processes))
+
+
+@instrumented
+@persistent
+def solve_part_1(filename: str, processes: Optional[int] = 1) -> int:
+    # Same IDs as is_invalid_id_1: a block repeated exactly twice
+    return scan(filename, RepeatedPattern(2, 2), processes)
 
 
-def solve_part_2(filename: str) -> int:
-    sum_ids = 0
-    for a, b in read_input(filename):
-        for x in range(a, b + 1):
-            if is_invalid_id_2(str(x)):
-                sum_ids += x
-    return sum_ids
+@instrumented
+@persistent
+def solve_part_2(filename: str, processes: Optional[int] = 1) -> int:
+    # Same IDs as is_invalid_id_2: a block repeated at least twice
+    return scan(filename, RepeatedPattern(2), processes)
 
 
 if __name__ == "__main__":
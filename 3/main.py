@@ -1,5 +1,17 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
+
+def parse_input(input_file):
+    return [line.strip() for line in input_file.text_lines()]
+
 def read_input(filename):
-    return [line.strip() for line in open(filename, 'r')]
+    with phase('parse'):
+        return cached(filename, parse_input)
 
 def get_max_joltage(bank, index, picks):
     n = len(bank)
@@ -15,8 +27,118 @@ def get_max_joltage(bank, index, picks):
     
     return dp[index][picks]
 
-def solve(filename, num_batteries):
-    return sum([ get_max_joltage(line, 0, num_batteries) for line in read_input(filename) ])
+class BankIndex:
+    # Sparse table over a bank's digits answering "leftmost maximum in
+    # [l, r]" in O(1), built once in O(n log n). The best k-digit joltage
+    # greedily takes the leftmost maximum of each window that still leaves
+    # room for the remaining picks, so any k costs O(k).
+
+    def __init__(self, bank):
+        self.digits = [int(c) for c in bank]
+        n = len(self.digits)
+        # table[j][i] = index of the leftmost maximum in [i, i + 2^j)
+        self.table = [list(range(n))]
+        j = 1
+        while (1 << j) <= n:
+            prev = self.table[-1]
+            half = 1 << (j - 1)
+            self.table.append([
+                self.better(prev[i], prev[i + half])
+                for i in range(n - (1 << j) + 1)
+            ])
+            j += 1
+
+    def better(self, a, b):
+        # a < b, so ties keep the leftmost index
+        return a if self.digits[a] >= self.digits[b] else b
+
+    def argmax(self, l, r):
+        j = (r - l + 1).bit_length() - 1
+        return self.better(self.table[j][l], self.table[j][r - (1 << j) + 1])
+
+    def max_joltage(self, picks):
+        n = len(self.digits)
+        if picks > n:
+            raise ValueError(f"Cannot pick {picks} batteries from a bank of {n}")
+        value = 0
+        pos = 0
+        for j in range(picks):
+            i = self.argmax(pos, n - picks + j)
+            value = value * 10 + self.digits[i]
+            pos = i + 1
+        return value
+
+
+def stream_banks(filename, batch_size):
+    # Banks in lists of at most batch_size, read lazily so memory does not
+    # grow with the file
+    with open(filename) as f:
+        batch = []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(line)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def batch_joltage(banks, pick_counts):
+    totals = [0] * len(pick_counts)
+    for bank in banks:
+        index = BankIndex(bank)
+        for i, picks in enumerate(pick_counts):
+            totals[i] += index.max_joltage(picks)
+    return totals
+
+
+def solve_streaming(filename, pick_counts, processes=None, batch_size=4096):
+    # solve_many over a process pool. At most two batches per worker are in
+    # flight, and their totals are folded in as they complete.
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+    processes = processes or os.cpu_count() or 1
+    totals = [0] * len(pick_counts)
+
+    def reduce(futures):
+        for future in futures:
+            for i, total in enumerate(future.result()):
+                totals[i] += total
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = set()
+        for batch in stream_banks(filename, batch_size):
+            count('banks', len(batch))
+            if len(pending) >= 2 * processes:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                reduce(done)
+            pending.add(pool.submit(batch_joltage, batch, pick_counts))
+        reduce(as_completed(pending))
+    return totals
+
+
+def solve_many(filename, pick_counts):
+    # Total joltage for every pick count, building each bank's index once
+    banks = read_input(filename)
+    count('banks', len(banks))
+    totals = [0] * len(pick_counts)
+    for bank in banks:
+        with phase('precompute'):
+            index = BankIndex(bank)
+        with phase('search'):
+            for i, picks in enumerate(pick_counts):
+                totals[i] += index.max_joltage(picks)
+    return totals
+
+@instrumented
+@persistent
+def solve(filename, num_batteries, processes=1):
+    if processes == 1:
+        return solve_many(filename, [num_batteries])[0]
+    with phase('search'):
+        return solve_streaming(filename, [num_batteries], processes)[0]
 
 if __name__ == "__main__":
     print(solve('sample.in', 2))
@@ -1,27 +1,168 @@
-import numpy as np
-from scipy.signal import convolve2d
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached, open_input
+from profiling import count, instrumented, phase
+from resultcache import persistent
+
+def parse_input(input_file):
+    import numpy as np
+    view, width = input_file.grid()
+    return (np.asarray(view)[:, :width] == ord('@')).astype(int)
 
 def read_input(filename):
-    lines = np.array([line.strip() for line in open(filename, 'r') if line.strip()])
-    return np.array([[1 if c == '@' else 0 for c in line] for line in lines])
+    with phase('parse'):
+        return cached(filename, parse_input)
 
-def get_removable_points(grid):
+def count_neighbors(grid):
+    import numpy as np
+    try:
+        from scipy.signal import convolve2d
+    except ImportError:
+        # Without SciPy, sum the 8 shifted views of the zero-padded grid
+        padded = np.pad(grid, 1)
+        rows, cols = grid.shape
+        return sum(
+            padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols]
+            for dr in (-1, 0, 1)
+            for dc in (-1, 0, 1)
+            if dr or dc
+        )
     kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
-    neighbor_count = convolve2d(grid, kernel, mode='same', boundary='fill', fillvalue=0)
+    return convolve2d(grid, kernel, mode='same', boundary='fill', fillvalue=0)
+
+def get_removable_points(grid):
+    neighbor_count = count_neighbors(grid)
     removable_mask = (grid == 1) & (neighbor_count < 4)
     return removable_mask
 
+@instrumented
+@persistent
 def solve_part_1(filename):
     grid = read_input(filename)
-    return np.sum(get_removable_points(grid))
+    with phase('search'):
+        return get_removable_points(grid).sum()
+
+# removal_rounds label for rolls that are never removed
+PERMANENT = 0xFFFF
+
+def removal_rounds(grid):
+    # The round in which every roll is removed when accessible rolls are
+    # cleared round after round, as a uint16 array: 0 for empty cells,
+    # PERMANENT for rolls that stay. Rounds are found as buckets of a queue
+    # in one pass: only neighbours of the rolls just removed can become
+    # accessible in the next round.
+    import numpy as np
+    rows, cols = grid.shape
+    # Flat indices into the zero-padded grid, so neighbours never wrap
+    stride = cols + 2
+    offsets = np.array([dr * stride + dc for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc])
+    alive = np.pad(grid != 0, 1).ravel()
+    degree = np.pad(count_neighbors(grid), 1).ravel()
+    labels = np.zeros(alive.size, dtype=np.uint16)
+
+    frontier = np.flatnonzero(alive & (degree < 4))
+    round_number = 0
+    while frontier.size:
+        round_number += 1
+        if round_number == PERMANENT:
+            raise OverflowError("More removal rounds than a uint16 label can hold")
+        labels[frontier] = round_number
+        alive[frontier] = False
+        neighbors = (frontier[:, None] + offsets).ravel()
+        np.subtract.at(degree, neighbors, 1)
+        neighbors = np.unique(neighbors)
+        frontier = neighbors[alive[neighbors] & (degree[neighbors] < 4)]
+    labels[alive] = PERMANENT
+    return labels.reshape(rows + 2, stride)[1:-1, 1:-1]
+
+def removed_per_round(labels):
+    # Rolls removed in rounds 1, 2, ...: element 0 is the part 1 answer and
+    # a cumulative sum gives the total for any round cutoff
+    import numpy as np
+    removed = labels[(labels != 0) & (labels != PERMANENT)]
+    return np.bincount(removed, minlength=1)[1:]
+
+# Worker state for the tiled engine: the two shared grid buffers and their shape
+_buffers = None
+
+def attach_buffers(names, shape):
+    from multiprocessing import shared_memory
+    global _buffers
+    _buffers = ([shared_memory.SharedMemory(name=name) for name in names], shape)
+
+def clear_band(source, r0, r1):
+    # One round for rows [r0, r1): read the band and its 1-row halo from
+    # buffer source and write the surviving rolls to the other buffer.
+    # Returns (rolls removed, removals in the first row, in the last row).
+    import numpy as np
+    blocks, shape = _buffers
+    src = np.ndarray(shape, dtype=np.uint8, buffer=blocks[source].buf)
+    dst = np.ndarray(shape, dtype=np.uint8, buffer=blocks[1 - source].buf)
+    lo, hi = max(r0 - 1, 0), min(r1 + 1, shape[0])
+    removable = get_removable_points(src[lo:hi])[r0 - lo:r1 - lo]
+    dst[r0:r1] = src[r0:r1] & ~removable
+    return int(removable.sum()), bool(removable[0].any()), bool(removable[-1].any())
+
+def solve_tiled(filename, processes=None, band_rows=1024):
+    # Part 2 for grids too big to iterate on one core. The grid lives in
+    # two shared uint8 buffers (read one, write the other, swap each
+    # round) and is cut into row bands that workers clear in parallel.
+    # Only bands that removed rolls, or whose neighbour removed rolls on
+    # the shared edge, run again; the rest are unchanged in both buffers.
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from multiprocessing import shared_memory
+    import numpy as np
+    view, width = open_input(filename).grid()
+    shape = (view.shape[0], width)
+    bands = [(r0, min(r0 + band_rows, shape[0])) for r0 in range(0, shape[0], band_rows)]
+    processes = processes or os.cpu_count() or 1
+
+    blocks = [shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1])) for _ in range(2)]
+    try:
+        with phase('parse'):
+            for block in blocks:
+                np.ndarray(shape, dtype=np.uint8, buffer=block.buf)[:] = np.asarray(view)[:, :width] == ord('@')
+
+        total_removed = 0
+        source = 0
+        active = set(range(len(bands)))
+        with ProcessPoolExecutor(max_workers=processes, initializer=attach_buffers,
+                                 initargs=([block.name for block in blocks], shape)) as pool:
+            while active:
+                count('rounds')
+                count('bands processed', len(active))
+                futures = {pool.submit(clear_band, source, *bands[i]): i for i in active}
+                active = set()
+                for future in as_completed(futures):
+                    i = futures[future]
+                    removed, top, bottom = future.result()
+                    total_removed += removed
+                    if removed:
+                        active.add(i)
+                    if top and i > 0:
+                        active.add(i - 1)
+                    if bottom and i < len(bands) - 1:
+                        active.add(i + 1)
+                source = 1 - source
+        return total_removed
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
 
-def solve_part_2(filename):
+@instrumented
+@persistent
+def solve_part_2(filename, processes=1):
+    if processes != 1:
+        with phase('search'):
+            return solve_tiled(filename, processes)
     grid = read_input(filename)
-    total_removed = 0
-    while (removable_mask := get_removable_points(grid)).any():
-        total_removed += np.sum(removable_mask)
-        grid[removable_mask] = 0
-    return total_removed
+    with phase('search'):
+        per_round = removed_per_round(removal_rounds(grid))
+    count('rounds', len(per_round))
+    return int(per_round.sum())
 
 if __name__ == "__main__":
     print(solve_part_1('sample.in'))
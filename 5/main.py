@@ -1,71 +1,160 @@
-def read_input(filename):
-    with open(filename, 'r') as f:
-        lines = [line.strip() for line in f]
-    
-    # Find the blank line that separates intervals from query numbers
-    blank_idx = lines.index('')
-    
-    # Parse intervals (lines before blank)
-    intervals = []
-    for line in lines[:blank_idx]:
-        if line:
-            start, end = line.split('-')
-            intervals.append((int(start), int(end)))
-    
-    # Parse query numbers (lines after blank)
-    query_numbers = []
-    for line in lines[blank_idx + 1:]:
-        if line:
-            query_numbers.append(int(line))
-    
+import os
+import sys
+from bisect import bisect_left, bisect_right
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
+
+def parse_input(input_file):
+    # A blank line separates "start-end" intervals from query numbers
+    fields = input_file.ints(0, signed=False)
+    intervals = list(zip(fields[0::2], fields[1::2]))
+    query_numbers = list(input_file.ints(1, signed=False))
     return intervals, query_numbers
 
+def read_input(filename):
+    with phase('parse'):
+        return cached(filename, parse_input)
+
+
+class IntervalSet:
+    # Disjoint, non-adjacent inclusive ranges kept as sorted starts/ends
+    # lists, with the number of covered IDs maintained on every update
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        self.total_covered = 0
+        for a, b in intervals:
+            self.add_range(a, b)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def _replace(self, lo, hi, ranges):
+        # Swap ranges [lo, hi) for ranges, keeping total_covered current
+        for i in range(lo, hi):
+            self.total_covered -= self.ends[i] - self.starts[i] + 1
+        for a, b in ranges:
+            self.total_covered += b - a + 1
+        self.starts[lo:hi] = [a for a, _ in ranges]
+        self.ends[lo:hi] = [b for _, b in ranges]
+
+    def add_range(self, a, b):
+        # Absorb every range overlapping or adjacent to [a, b]
+        lo = bisect_left(self.ends, a - 1)
+        hi = bisect_right(self.starts, b + 1)
+        if lo < hi:
+            a = min(a, self.starts[lo])
+            b = max(b, self.ends[hi - 1])
+        self._replace(lo, hi, [(a, b)])
+
+    def remove_range(self, a, b):
+        lo = bisect_left(self.ends, a)
+        hi = bisect_right(self.starts, b)
+        if lo >= hi:
+            return
+        # Keep whatever sticks out on either side of [a, b]
+        pieces = []
+        if self.starts[lo] < a:
+            pieces.append((self.starts[lo], a - 1))
+        if self.ends[hi - 1] > b:
+            pieces.append((b + 1, self.ends[hi - 1]))
+        self._replace(lo, hi, pieces)
 
+    def contains(self, x):
+        i = bisect_right(self.starts, x) - 1
+        return i >= 0 and x <= self.ends[i]
+
+    def count_fresh(self, query_numbers):
+        return sum(1 for x in query_numbers if self.contains(x))
+
+
+@instrumented
+@persistent
 def solve_part_1(filename):
     intervals, query_numbers = read_input(filename)
+    count('ranges', len(intervals))
+    count('queries', len(query_numbers))
 
-    num_fresh = 0
-    for query_number in query_numbers:
-        is_fresh = False
-        for a, b in intervals:
-            if a <= query_number <= b:
-                is_fresh = True
-                break
-        if is_fresh:
-            num_fresh += 1
-    return num_fresh
+    with phase('build'):
+        fresh = IntervalSet(intervals)
+    with phase('search'):
+        return fresh.count_fresh(query_numbers)
 
 
-def solve_part_2(filename):
-    intervals, _ = read_input(filename)
+def merge_ranges(intervals):
+    # Pure-Python merge of inclusive ranges. With starts and ends sorted
+    # separately, a merged range closes at ends[i] whenever the next start
+    # lies past it, since every range opened so far has then been closed.
+    starts = sorted(a for a, _ in intervals)
+    ends = sorted(b for _, b in intervals)
+    merged = []
+    for i in range(len(starts)):
+        if i == 0 or starts[i] > ends[i - 1]:
+            range_start = starts[i]
+        if i == len(starts) - 1 or starts[i + 1] > ends[i]:
+            merged.append((range_start, ends[i]))
+    return merged
 
-    # Sort intervals by their endpoints (events)
-    events = []
-    for a, b in intervals:
-        events.append((a, 0, 'open'))  # 0 sorts before 1
-        events.append((b, 1, 'close'))  # 1 sorts after 0
-    events.sort()
+
+def merge_range_sets(range_sets):
+    # Merge many independent range sets (files, ID namespaces) in one NumPy
+    # pass. Returns [(merged (k, 2) int64 array, total coverage)] per set.
+    import numpy as np
+    set_ids = np.repeat(np.arange(len(range_sets)), [len(ranges) for ranges in range_sets])
+    bounds = np.array([r for ranges in range_sets for r in ranges], dtype=np.int64).reshape(-1, 2)
     
-    # Extract just position and event type for processing
-    events = [(pos, event_type) for pos, _, event_type in events]
-    total_sum = 0
-    open_count = 0
-    range_start = None
+    # Sort starts and ends separately within each set (the set id is the
+    # primary key, and both orders keep the sets in the same slots)
+    starts = bounds[np.lexsort((bounds[:, 0], set_ids)), 0]
+    ends = bounds[np.lexsort((bounds[:, 1], set_ids)), 1]
+    set_ids = np.sort(set_ids)
     
-    for pos, event_type in events:
-        if event_type == 'open':
-            if open_count == 0:
-                range_start = pos
-            open_count += 1
-        else:  # close event
-            open_count -= 1
-            if open_count == 0:
-                # Sum all numbers from range_start to pos (inclusive)
-                # print(range_start, pos, '->', (pos - range_start + 1))
-                total_sum += (pos - range_start + 1)
-
+    # A merged range closes where the next start (in the same set) lies
+    # past the current end
+    closes = np.ones(len(starts), dtype=bool)
+    closes[:-1] = (starts[1:] > ends[:-1]) | (set_ids[1:] != set_ids[:-1])
+    opens = np.ones(len(starts), dtype=bool)
+    opens[1:] = closes[:-1]
+    merged = np.stack([starts[opens], ends[closes]], axis=1)
+    merged_sets = set_ids[closes]
     
-    return total_sum
+    # merged_sets is sorted, so each set is one contiguous slice
+    bounds = np.searchsorted(merged_sets, np.arange(len(range_sets) + 1))
+    covered = np.concatenate([[0], np.cumsum(merged[:, 1] - merged[:, 0] + 1)])
+    totals = (covered[bounds[1:]] - covered[bounds[:-1]]).tolist()
+    return list(zip(np.split(merged, bounds[1:-1]), totals))
+
+
+def coverage(intervals):
+    try:
+        import numpy
+    except ImportError:
+        return sum(b - a + 1 for a, b in merge_ranges(intervals))
+    return merge_range_sets([intervals])[0][1]
+
+
+@instrumented
+@persistent
+def solve_part_2(filename):
+    intervals, _ = read_input(filename)
+    count('ranges', len(intervals))
+    with phase('reduce'):
+        return coverage(intervals)
+
+
+def solve_many(filenames):
+    # Part 2 for a batch of files in one merge
+    with phase('parse'):
+        range_sets = [read_input(filename)[0] for filename in filenames]
+    with phase('reduce'):
+        return [total for _, total in merge_range_sets(range_sets)]
 
 
 
@@ -1,6 +1,20 @@
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
+
+def read_lines(input_file):
+    lines = input_file.text_lines()
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
 def read_input(filename, vertical=True):
-    with open(filename) as f:
-        lines = f.read().rstrip('\n').split('\n')
+    lines = cached(filename, read_lines)
     
     # Last line contains operators, everything else is the grid
     operator_line = lines[-1]
@@ -87,14 +101,119 @@ def calculate(grid, operators):
     return sum(ret)
 
 
-def solve_part_1(filename):
-    grid, operators = read_input(filename, vertical=False)
-    return calculate(grid, operators)
+def find_operator_line(f, chunk_size):
+    # Seek to the end and scan backwards for the last non-empty line
+    f.seek(0, 2)
+    end = f.tell()
+    tail = b''
+    pos = end
+    while pos > 0:
+        step = min(chunk_size, pos)
+        pos -= step
+        f.seek(pos)
+        tail = f.read(step) + tail
+        stripped = tail.rstrip(b'\r\n')
+        newline = stripped.rfind(b'\n')
+        if newline != -1:
+            return pos + newline + 1, len(stripped) - newline - 1
+    stripped = tail.rstrip(b'\r\n')
+    return 0, len(stripped)
+
+def find_grid_lines(f, end, chunk_size):
+    # Offsets and lengths of every line before the operator line
+    spans = []
+    start = 0
+    pos = 0
+    f.seek(0)
+    while pos < end:
+        chunk = f.read(min(chunk_size, end - pos))
+        if not chunk:
+            break
+        idx = chunk.find(b'\n')
+        while idx != -1:
+            spans.append((start, pos + idx - start))
+            start = pos + idx + 1
+            idx = chunk.find(b'\n', idx + 1)
+        pos += len(chunk)
+    if pos > start:
+        spans.append((start, pos - start))
+    return spans
+
+def read_window(f, start, length, col, size):
+    # Bytes [col, col + size) of one line, padded with spaces past its end
+    data = b''
+    if col < length:
+        f.seek(start + col)
+        data = f.read(min(size, length - col))
+    return data.ljust(size, b' ')
+
+def evaluate_problem(rows, operator, vertical):
+    if vertical:
+        numbers = []
+        for col in range(len(rows[0])):
+            digits = bytes(row[col] for row in rows if chr(row[col]).isdigit())
+            numbers.append(int(digits))
+    else:
+        numbers = [int(row) for row in rows if row.strip()]
+    # Zeros are skipped in products, as calculate does for its padding
+    return sum(numbers) if operator == '+' else math.prod(n for n in numbers if n)
+
+def stream_problems(filename, vertical=True, window=1 << 16):
+    # Walk the worksheet column by column in fixed-width windows, yielding
+    # each problem's result as soon as its separator column is seen. Only
+    # the rows of the current problem are held in memory.
+    with open(filename, 'rb') as f:
+        op_start, op_length = find_operator_line(f, window)
+        lines = find_grid_lines(f, op_start, window)
+        width = max([length for _, length in lines] + [op_length])
+
+        rows = [bytearray() for _ in lines]
+        operator = None
+        for col in range(0, width, window):
+            size = min(window, width - col)
+            blocks = [read_window(f, start, length, col, size) for start, length in lines]
+            ops = read_window(f, op_start, op_length, col, size)
+            for k in range(size):
+                column = [block[k] for block in blocks]
+                if not any(chr(c).isdigit() for c in column):
+                    # Separator column
+                    if operator is not None:
+                        yield evaluate_problem(rows, operator, vertical)
+                    rows = [bytearray() for _ in lines]
+                    operator = None
+                    continue
+                for row, c in zip(rows, column):
+                    row.append(c)
+                if operator is None and chr(ops[k]) in '*+':
+                    operator = chr(ops[k])
+        if operator is not None:
+            yield evaluate_problem(rows, operator, vertical)
+
+
+@instrumented
+@persistent
+def solve_part_1(filename, streaming=False):
+    if streaming:
+        with phase('search'):
+            return sum(stream_problems(filename, vertical=False))
+    with phase('parse'):
+        grid, operators = read_input(filename, vertical=False)
+    count('problems', len(operators))
+    with phase('reduce'):
+        return calculate(grid, operators)
 
 
-def solve_part_2(filename):
-    grid, operators = read_input(filename, vertical=True)
-    return calculate(grid, operators)
+@instrumented
+@persistent
+def solve_part_2(filename, streaming=False):
+    if streaming:
+        with phase('search'):
+            return sum(stream_problems(filename, vertical=True))
+    with phase('parse'):
+        grid, operators = read_input(filename, vertical=True)
+    count('problems', len(operators))
+    with phase('reduce'):
+        return calculate(grid, operators)
 
 
 
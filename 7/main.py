@@ -1,22 +1,31 @@
-def find_and_replace_start(grid, marker='S'):
-    for row, line in enumerate(grid):
-        for col, cell in enumerate(line):
-            if cell == marker:
-                grid[row][col] = '.'
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
+
+def find_start(grid, width, marker='S'):
+    for row in range(len(grid)):
+        for col in range(width):
+            if grid[row, col] == ord(marker):
                 return (row, col)
     return (None, None)
 
+def parse_input(input_file):
+    # grid is a 2-D byte view; only '^' cells matter, so 'S' can stay
+    grid, width = input_file.grid()
+    return grid, width, find_start(grid, width, 'S')
+
 def read_input(filename):
-    with open(filename) as f:
-        grid = [list(line.strip()) for line in f]
-    start = find_and_replace_start(grid, 'S')
-    return grid, start
+    with phase('parse'):
+        return cached(filename, parse_input)
 
 def simulate_beams(filename, count_splits=True):
-    grid, (s_row, s_col) = read_input(filename)
+    grid, cols, (s_row, s_col) = read_input(filename)
     
     rows = len(grid)
-    cols = len(grid[0])
     
     # Track beams in each column for the current row
     current_beams = [0] * cols
@@ -24,34 +33,110 @@ def simulate_beams(filename, count_splits=True):
     splits_encountered = 0
     
     # Process each row starting from the starting row
-    for row in range(s_row, rows):
-        next_beams = [0] * cols
-        
-        for col in range(cols):
-            if current_beams[col] > 0:
-                if grid[row][col] == '^':
-                    # This is a split
-                    splits_encountered += 1
-                    
-                    # Beams go left and right
-                    if col - 1 >= 0:
-                        next_beams[col - 1] += current_beams[col]
-                    if col + 1 < cols:
-                        next_beams[col + 1] += current_beams[col]
-                else:
-                    # No split, beam continues straight down
-                    next_beams[col] += current_beams[col]
-        
-        current_beams = next_beams
+    with phase('search'):
+        for row in range(s_row, rows):
+            next_beams = [0] * cols
+            
+            for col in range(cols):
+                if current_beams[col] > 0:
+                    if grid[row, col] == ord('^'):
+                        # This is a split
+                        splits_encountered += 1
+                        
+                        # Beams go left and right
+                        if col - 1 >= 0:
+                            next_beams[col - 1] += current_beams[col]
+                        if col + 1 < cols:
+                            next_beams[col + 1] += current_beams[col]
+                    else:
+                        # No split, beam continues straight down
+                        next_beams[col] += current_beams[col]
+            
+            current_beams = next_beams
+    count('splits', splits_encountered)
     
     if count_splits:
         return splits_encountered
     else:
         return sum(current_beams)
     
+# Beam counts are linear in the beams entering a row, so a block of rows is
+# a sparse transfer operator: op[col] = {exit column: number of beams} for
+# one beam entering at col. Operators of consecutive blocks compose
+# associatively.
+
+def row_operator(grid, row, cols):
+    op = []
+    for col in range(cols):
+        if grid[row, col] == ord('^'):
+            op.append({c: 1 for c in (col - 1, col + 1) if 0 <= c < cols})
+        else:
+            op.append({col: 1})
+    return op
+
+def compose(first, second):
+    # The operator for first's rows followed by second's rows
+    op = []
+    for exits in first:
+        combined = {}
+        for mid, beams in exits.items():
+            for col, more in second[mid].items():
+                combined[col] = combined.get(col, 0) + beams * more
+        op.append(combined)
+    return op
+
+def block_operator(filename, r0, r1):
+    # Rows [r0, r1), applied row by row to every entry column
+    grid, cols, _ = read_input(filename)
+    op = [{col: 1} for col in range(cols)]
+    for row in range(r0, r1):
+        op = compose(op, row_operator(grid, row, cols))
+    return op
+
+def transfer_operator(filename, first_row=None, processes=None, blocks_per_process=2):
+    # Operator from first_row (default: the S row) to the bottom. Blocks of
+    # rows are built by workers and combined pairwise in a tree reduction.
+    from concurrent.futures import ProcessPoolExecutor
+    grid, cols, (s_row, _) = read_input(filename)
+    first_row = s_row if first_row is None else first_row
+    processes = processes or os.cpu_count() or 1
+    num_blocks = max(1, min(len(grid) - first_row, processes * blocks_per_process))
+    bounds = [first_row + (len(grid) - first_row) * i // num_blocks for i in range(num_blocks + 1)]
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        with phase('precompute'):
+            ops = list(pool.map(block_operator, [filename] * num_blocks, bounds[:-1], bounds[1:]))
+        with phase('reduce'):
+            while len(ops) > 1:
+                count('compositions', len(ops) // 2)
+                paired = list(pool.map(compose, ops[0:-1:2], ops[1::2]))
+                ops = paired + ops[len(ops) - len(ops) % 2:]
+    return ops[0]
+
+def exit_counts(filename, processes=1):
+    # Beams leaving the bottom for a beam started at every column of the S
+    # row. In-process this is one backward pass: the beams a column
+    # produces are those its successors in the next row produce.
+    if processes != 1:
+        return [sum(exits.values()) for exits in transfer_operator(filename, processes=processes)]
+    grid, cols, (s_row, _) = read_input(filename)
+    beams = [1] * cols
+    with phase('search'):
+        for row in range(len(grid) - 1, s_row - 1, -1):
+            beams = [
+                (beams[col - 1] if col > 0 else 0) + (beams[col + 1] if col + 1 < cols else 0)
+                if grid[row, col] == ord('^') else beams[col]
+                for col in range(cols)
+            ]
+    return beams
+
+@instrumented
+@persistent
 def solve_part_1(filename):
     return simulate_beams(filename, count_splits=True)
 
+@instrumented
+@persistent
 def solve_part_2(filename):
     return simulate_beams(filename, count_splits=False)
 
@@ -1,6 +1,11 @@
+import os
+import sys
 from functools import reduce
 from operator import mul
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+
 class DisjointSet:
     def __init__(self, elements):
         self.parent = {elem: elem for elem in elements}
@@ -29,15 +34,12 @@ class DisjointSet:
     def __getitem__(self, elem):
         return self.find(elem)
 
+def parse_input(input_file):
+    fields = input_file.ints()
+    return list(zip(fields[0::3], fields[1::3], fields[2::3]))
+
 def read_input(filename):
-    with open(filename) as f:
-        coordinates = []
-        for line in f:
-            line = line.strip()
-            if line:
-                x, y, z = map(int, line.split(','))
-                coordinates.append((x, y, z))
-        return coordinates
+    return cached(filename, parse_input)
 
 def create_sorted_pairs(coordinates):
     return sorted([
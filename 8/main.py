@@ -1,56 +1,161 @@
+import os
+import sys
 from functools import reduce
 from operator import mul
-from scipy.cluster.hierarchy import DisjointSet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from profiling import count, instrumented, phase
+from resultcache import persistent
+from scripts import load_script
+
+# The pure-Python version, which also owns the input parser
+NODEPS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main-nodeps.py')
+
+def make_disjoint_set(elements):
+    try:
+        from scipy.cluster.hierarchy import DisjointSet
+    except ImportError:
+        # Fall back to the pure-Python implementation in main-nodeps.py
+        DisjointSet = load_script(NODEPS).DisjointSet
+    return DisjointSet(elements)
 
 def read_input(filename):
-    with open(filename) as f:
-        coordinates = []
-        for line in f:
-            line = line.strip()
-            if line:
-                x, y, z = map(int, line.split(','))
-                coordinates.append((x, y, z))
-        return coordinates
+    with phase('parse'):
+        return load_script(NODEPS).read_input(filename)
 
 def create_sorted_pairs(coordinates):
+    count('pairs generated', len(coordinates) * (len(coordinates) - 1) // 2)
     return sorted([
         (((coordinates[i][0] - coordinates[j][0])**2 + (coordinates[i][1] - coordinates[j][1])**2 + (coordinates[i][2] - coordinates[j][2])**2)**0.5, coordinates[i], coordinates[j])
         for i in range(len(coordinates))
         for j in range(i + 1, len(coordinates))
     ])
 
-def solve_part_1(filename, best_k=1000):
+def k_smallest(dist, k, tie_order=None):
+    # Positions of the k smallest distances. Ties at the cut are taken in
+    # the order tie_order(positions) sorts them into, or in position order.
+    import numpy as np
+    if len(dist) <= k:
+        return np.arange(len(dist))
+    kth = np.partition(dist, k - 1)[k - 1]
+    below = np.flatnonzero(dist < kth)
+    ties = np.flatnonzero(dist == kth)
+    if tie_order is not None:
+        ties = ties[tie_order(ties)]
+    return np.concatenate([below, ties[:k - len(below)]])
+
+def nearest_pairs(coordinates, k, block_size=1024):
+    # The k closest pairs as (i, j) index pairs with i < j, in the order
+    # create_sorted_pairs gives them. Squared distances are exact int64 and
+    # computed block_size rows at a time against the columns past the
+    # block's first row, so memory stays O(block_size * n) while a running
+    # top-k is merged with each block's.
+    import numpy as np
+    points = np.asarray(coordinates, dtype=np.int64).reshape(-1, 3)
+    n = len(points)
+
+    # create_sorted_pairs breaks distance ties by (coordinates[i],
+    # coordinates[j]), then by (i, j) through sorted()'s stability. Rank the
+    # points by coordinate, equal points sharing a rank, and order tied
+    # pairs by (rank[i], rank[j]) and then (i, j).
+    by_coordinate = np.lexsort(points.T[::-1])
+    ranked = points[by_coordinate]
+    rank = np.empty(n, dtype=np.int64)
+    rank[by_coordinate] = np.cumsum(np.r_[True, (ranked[1:] != ranked[:-1]).any(axis=1)]) - 1
+
+    def tie_keys(pairs):
+        i, j = np.divmod(pairs, n)
+        return pairs, rank[i] * n + rank[j]
+
+    best_d = np.empty(0, dtype=np.int64)
+    # Pairs as i * n + j
+    best_pairs = np.empty(0, dtype=np.int64)
+    for i0 in range(0, n - 1, block_size):
+        i1 = min(i0 + block_size, n - 1)
+        dist = np.zeros((i1 - i0, n - i0 - 1), dtype=np.int64)
+        for axis in range(3):
+            dist += (points[i0:i1, axis, None] - points[None, i0 + 1:, axis]) ** 2
+        # Row i0 + r pairs with columns j > i0 + r, so drop the small
+        # triangle j <= i0 + r inside the block
+        dist[np.tril_indices(i1 - i0, -1, n - i0 - 1)] = np.iinfo(np.int64).max
+        valid = (i1 - i0) * (n - i0 - 1) - (i1 - i0) * (i1 - i0 - 1) // 2
+        flat = dist.ravel()
+
+        def block_pairs(positions):
+            rows, cols = np.divmod(positions, n - i0 - 1)
+            return (i0 + rows) * n + i0 + 1 + cols
+
+        keep = k_smallest(flat, min(k, valid), lambda ties: np.lexsort(tie_keys(block_pairs(ties))))
+        best_d = np.concatenate([best_d, flat[keep]])
+        best_pairs = np.concatenate([best_pairs, block_pairs(keep)])
+        keep = k_smallest(best_d, k, lambda ties: np.lexsort(tie_keys(best_pairs[ties])))
+        best_d, best_pairs = best_d[keep], best_pairs[keep]
+    count('pairs generated', n * (n - 1) // 2)
+    order = np.lexsort(tie_keys(best_pairs) + (best_d,))
+    i, j = np.divmod(best_pairs[order], n)
+    return list(zip(i.tolist(), j.tolist()))
+
+def closest_pairs(coordinates, k, block_size=1024):
+    # The k closest coordinate pairs, blocked in NumPy when available
+    try:
+        import numpy
+    except ImportError:
+        return [(coord1, coord2) for _, coord1, coord2 in create_sorted_pairs(coordinates)[:k]]
+    return [(coordinates[i], coordinates[j]) for i, j in nearest_pairs(coordinates, k, block_size)]
+
+def check_closest_pairs(filename, k=1000, block_size=1024):
+    # The NumPy top-k has to match the pure-Python sort pair for pair, ties
+    # included, or part 1 would depend on whether NumPy is installed
     coordinates = read_input(filename)
-    pairs = create_sorted_pairs(coordinates)
-    dsu = DisjointSet(coordinates)
-    for i in range(min(best_k, len(pairs))):
-        dist, coord1, coord2 = pairs[i]
-        dsu.merge(coord1, coord2)
+    expected = [(coord1, coord2) for _, coord1, coord2 in create_sorted_pairs(coordinates)[:k]]
+    actual = closest_pairs(coordinates, k, block_size)
+    if actual != expected:
+        mismatch = next(i for i, (a, b) in enumerate(zip(actual, expected)) if a != b)
+        raise AssertionError(f"closest pair {mismatch}: NumPy gave {actual[mismatch]}, sort gave {expected[mismatch]}")
+
+@instrumented
+@persistent
+def solve_part_1(filename, best_k=1000, block_size=1024):
+    coordinates = read_input(filename)
+    with phase('precompute'):
+        pairs = closest_pairs(coordinates, best_k, block_size)
+    with phase('search'):
+        dsu = make_disjoint_set(coordinates)
+        for coord1, coord2 in pairs:
+            dsu.merge(coord1, coord2)
+            count('merges performed')
     
     # Get component sizes
-    components = {}
-    for coord in coordinates:
-        root = dsu[coord]
-        if root not in components:
-            components[root] = 0
-        components[root] += 1
-    sizes = sorted(components.values(), reverse=True)[:3]
+    with phase('reduce'):
+        components = {}
+        for coord in coordinates:
+            root = dsu[coord]
+            if root not in components:
+                components[root] = 0
+            components[root] += 1
+        sizes = sorted(components.values(), reverse=True)[:3]
     return reduce(mul, sizes, 1)
 
+@instrumented
+@persistent
 def solve_part_2(filename):
     coordinates = read_input(filename)
-    pairs = create_sorted_pairs(coordinates)
-    dsu = DisjointSet(coordinates)
-    for i in range(len(pairs)):
-        dist, coord1, coord2 = pairs[i]
-        dsu.merge(coord1, coord2)
-        
-        # Check if all coordinates are in one component
-        num_components = len(set(dsu[coord] for coord in coordinates))
-        if num_components == 1:
-            return coord1[0] * coord2[0]
+    with phase('precompute'):
+        pairs = create_sorted_pairs(coordinates)
+    with phase('search'):
+        dsu = make_disjoint_set(coordinates)
+        for i in range(len(pairs)):
+            dist, coord1, coord2 = pairs[i]
+            dsu.merge(coord1, coord2)
+            count('merges performed')
+            
+            # Check if all coordinates are in one component
+            num_components = len(set(dsu[coord] for coord in coordinates))
+            if num_components == 1:
+                return coord1[0] * coord2[0]
             
 if __name__ == "__main__":
+    check_closest_pairs('sample.in', 10)
     print(solve_part_1('sample.in', best_k=10))
     print(solve_part_1('part1.in',  best_k=1000))
     print(solve_part_2('sample.in'))
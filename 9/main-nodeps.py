@@ -1,3 +1,13 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+
+def parse_input(input_file):
+    fields = input_file.ints()
+    return list(zip(fields[0::2], fields[1::2]))
+
 def point_in_polygon(px, py, poly):
     n = len(poly)
     inside = False
@@ -42,8 +52,149 @@ def polygon_covers_rect(poly, min_x, min_y, max_x, max_y):
                 return False
     return True
 
+# The NumPy backend below handles rectilinear polygons, whose edges split
+# into horizontal (y, x_lo, x_hi) and vertical (x, y_lo, y_hi) arrays
+
+def rectilinear_edges(poly):
+    # (horizontal, vertical) structured edge arrays, or None if an edge is
+    # diagonal
+    import numpy as np
+    edge = np.dtype([('at', np.int64), ('lo', np.int64), ('hi', np.int64)])
+    horizontal, vertical = [], []
+    for (x1, y1), (x2, y2) in zip(poly, poly[1:] + poly[:1]):
+        if y1 == y2:
+            horizontal.append((y1, min(x1, x2), max(x1, x2)))
+        elif x1 == x2:
+            vertical.append((x1, min(y1, y2), max(y1, y2)))
+        else:
+            return None
+    return np.array(horizontal, dtype=edge), np.array(vertical, dtype=edge)
+
+def points_in_polygon(edges, px, py):
+    # Vectorized point_in_polygon: on an edge, or an odd number of vertical
+    # edges to the right of the point span its y (half-open, as there)
+    horizontal, vertical = edges
+    px, py = px[:, None], py[:, None]
+    on_edge = (
+        ((py == horizontal['at']) & (horizontal['lo'] <= px) & (px <= horizontal['hi'])).any(axis=1)
+        | ((px == vertical['at']) & (vertical['lo'] <= py) & (py <= vertical['hi'])).any(axis=1)
+    )
+    crossings = ((vertical['lo'] <= py) & (py < vertical['hi']) & (px < vertical['at'])).sum(axis=1)
+    return on_edge | (crossings % 2 == 1)
+
+def rects_covered(edges, min_x, min_y, max_x, max_y):
+    # Vectorized polygon_covers_rect for arrays of rectangles: every corner
+    # inside, and no polygon edge properly crossing a rectangle edge
+    import numpy as np
+    horizontal, vertical = edges
+    covered = np.ones(len(min_x), dtype=bool)
+    for px, py in ((min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)):
+        covered &= points_in_polygon(edges, px, py)
+    x0, x1 = min_x[:, None], max_x[:, None]
+    y0, y1 = min_y[:, None], max_y[:, None]
+    spans_x = (x0 < vertical['at']) & (vertical['at'] < x1)
+    for y in (y0, y1):
+        covered &= ~(spans_x & (vertical['lo'] < y) & (y < vertical['hi'])).any(axis=1)
+    spans_y = (y0 < horizontal['at']) & (horizontal['at'] < y1)
+    for x in (x0, x1):
+        covered &= ~(spans_y & (horizontal['lo'] < x) & (x < horizontal['hi'])).any(axis=1)
+    return covered
+
+def coverage_mask(edges, min_x, min_y, max_x, max_y, chunk_size=4096):
+    # rects_covered in chunks of rectangles, bounding memory to
+    # O(chunk_size * edges)
+    import numpy as np
+    return np.concatenate([
+        rects_covered(edges, min_x[i:i + chunk_size], min_y[i:i + chunk_size],
+                      max_x[i:i + chunk_size], max_y[i:i + chunk_size])
+        for i in range(0, len(min_x), chunk_size)
+    ] or [np.zeros(0, dtype=bool)])
+
+def max_inscribed_rectangle(xy, edges, chunk_size=4096):
+    # Candidates are generated a block of first corners at a time (about
+    # chunk_size pairs), so memory stays bounded. Only those beating the best
+    # area so far are tested, in order of decreasing area, so the first
+    # covered one ends the block.
+    import numpy as np
+    points = np.array(xy, dtype=np.int64).reshape(-1, 2)
+    n = len(points)
+    rows_per_block = max(1, chunk_size // max(n, 1))
+    best = 0
+    for i0 in range(0, n - 1, rows_per_block):
+        i = np.repeat(np.arange(i0, min(i0 + rows_per_block, n - 1)), n)
+        j = np.tile(np.arange(n), len(i) // n)
+        i, j = i[j > i], j[j > i]
+        min_x, max_x = np.minimum(points[i, 0], points[j, 0]), np.maximum(points[i, 0], points[j, 0])
+        min_y, max_y = np.minimum(points[i, 1], points[j, 1]), np.maximum(points[i, 1], points[j, 1])
+        area = (max_x - min_x + 1) * (max_y - min_y + 1)
+        order = np.flatnonzero(area > best)
+        order = order[np.argsort(-area[order], kind='stable')]
+        for start in range(0, len(order), chunk_size):
+            chunk = order[start:start + chunk_size]
+            covered = rects_covered(edges, min_x[chunk], min_y[chunk], max_x[chunk], max_y[chunk])
+            if covered.any():
+                best = int(area[chunk][covered].max())
+                break
+    return best
+
+def lower_left_frontier(points):
+    # Points with no other point both left of and below them, by x
+    # ascending (so y descending)
+    frontier = []
+    for x, y in sorted(points):
+        if not frontier or y < frontier[-1][1]:
+            frontier.append((x, y))
+    return frontier
+
+def upper_right_frontier(points):
+    # Points with no other point both right of and above them, by x
+    # ascending (so y descending)
+    frontier = []
+    for x, y in sorted(points, reverse=True):
+        if not frontier or y > frontier[-1][1]:
+            frontier.append((x, y))
+    return frontier[::-1]
+
+def staircase_max_area(lower, upper):
+    # Largest rectangle with a corner from each staircase. The best upper
+    # partner only moves right as the lower corner does, so halving the
+    # lower staircase and narrowing the partner range costs O(m log m).
+    def area(p, q):
+        return (q[0] - p[0] + 1) * (q[1] - p[1] + 1)
+
+    max_area = 0
+    stack = [(0, len(lower) - 1, 0, len(upper) - 1)]
+    while stack:
+        lo, hi, q_lo, q_hi = stack.pop()
+        if lo > hi:
+            continue
+        mid = (lo + hi) // 2
+        best = max(range(q_lo, q_hi + 1), key=lambda j: area(lower[mid], upper[j]))
+        max_area = max(max_area, area(lower[mid], upper[best]))
+        stack.append((lo, mid - 1, q_lo, best))
+        stack.append((mid + 1, hi, best, q_hi))
+    return max_area
+
+def max_rectangle(xy):
+    # Unconstrained part 1: the best pair is a bottom-left and a top-right
+    # corner, or a top-left and a bottom-right one (the same search with y
+    # flipped), and each corner can be pushed out to its Pareto frontier
+    flipped = [(x, -y) for x, y in xy]
+    return max(
+        staircase_max_area(lower_left_frontier(xy), upper_right_frontier(xy)),
+        staircase_max_area(lower_left_frontier(flipped), upper_right_frontier(flipped)),
+    )
+
 def solve(filename, inscribed=False):
-    xy = [tuple(map(int, line.strip().split(','))) for line in open(filename)]
+    xy = cached(filename, parse_input)
+    if not inscribed:
+        return max_rectangle(xy)
+    try:
+        edges = rectilinear_edges(xy)
+    except ImportError:
+        edges = None
+    if edges is not None:
+        return max_inscribed_rectangle(xy, edges)
     max_area = 0
     
     # Precompute bounding box for early rejection
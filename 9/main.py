@@ -1,20 +1,46 @@
-from shapely.geometry import Polygon
-from shapely.prepared import prep    
+import os
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inputs import cached
+from profiling import count, instrumented, phase
+from resultcache import persistent
+from scripts import load_script
+
+# The pure-Python version, which also owns the input parser
+NODEPS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main-nodeps.py')
+
+@instrumented
+@persistent
 def solve(filename, inscribed=False):
-    xy = [tuple(map(int, line.strip().split(','))) for line in open(filename)]
-    polygon = Polygon(xy)
-    prepared_polygon = prep(polygon)
+    nodeps = load_script(NODEPS)
+    with phase('parse'):
+        xy = cached(filename, nodeps.parse_input)
+    if not inscribed:
+        with phase('search'):
+            return nodeps.max_rectangle(xy)
+    try:
+        from shapely.geometry import Polygon
+        from shapely.prepared import prep
+    except ImportError:
+        # Fall back to the pure-Python implementation in main-nodeps.py
+        return nodeps.solve(filename, inscribed)
+    
+    with phase('build'):
+        polygon = Polygon(xy)
+        prepared_polygon = prep(polygon)
     max_area = 0
-    for i in range(len(xy)):
-        for j in range(i + 1, len(xy)):
-            x1, y1 = xy[i]
-            x2, y2 = xy[j]
-            min_x, max_x = min(x1, x2), max(x1, x2)
-            min_y, max_y = min(y1, y2), max(y1, y2)
-            rect = Polygon([(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)])
-            if not inscribed or prepared_polygon.covers(rect):
-                max_area = max(max_area, (max_x - min_x + 1) * (max_y - min_y + 1))
+    count('rectangles checked', len(xy) * (len(xy) - 1) // 2)
+    with phase('search'):
+        for i in range(len(xy)):
+            for j in range(i + 1, len(xy)):
+                x1, y1 = xy[i]
+                x2, y2 = xy[j]
+                min_x, max_x = min(x1, x2), max(x1, x2)
+                min_y, max_y = min(y1, y2), max(y1, y2)
+                rect = Polygon([(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)])
+                if not inscribed or prepared_polygon.covers(rect):
+                    max_area = max(max_area, (max_x - min_x + 1) * (max_y - min_y + 1))
     return max_area
 
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+import glob
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Loads a day module the way `python main.py` would, minus the __main__ block
+LOADER = '''
+import importlib.util, sys
+path = sys.argv[1]
+sys.path.insert(0, __import__('os').path.dirname(path))
+spec = importlib.util.spec_from_file_location('day', path)
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+'''
+
+def import_time(path):
+    # Run the loader under -X importtime and parse the per-package timings.
+    # Returns (total microseconds, [(cumulative us, package), ...]).
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', LOADER, path],
+        capture_output=True, text=True, cwd=os.path.dirname(path),
+    )
+    packages = []
+    for line in proc.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)', line)
+        # Only count top-level imports; nested ones are part of their parent
+        if match and len(match.group(3)) == 1:
+            packages.append((int(match.group(2)), match.group(4)))
+    return sum(us for us, _ in packages), sorted(packages, reverse=True)
+
+def main(top=3):
+    paths = sorted(
+        glob.glob(os.path.join(ROOT, '*', 'main*.py')),
+        key=lambda p: (int(os.path.basename(os.path.dirname(p))), p),
+    )
+    for path in paths:
+        total, packages = import_time(path)
+        heaviest = ', '.join(f"{name} {us / 1000:.1f} ms" for us, name in packages[:top])
+        print(f"{os.path.relpath(path, ROOT):24} {total / 1000:8.1f} ms  ({heaviest})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import mmap
+import os
+import re
+from array import array
+
+# abspath -> (mtime_ns, size, InputFile)
+_files = {}
+# (abspath, parse) -> (mtime_ns, size, result)
+_parsed = {}
+
+
+class InputFile:
+    # A puzzle input memory-mapped once, with zero-copy views into it
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.view = memoryview(self.data)
+
+        # Line i spans [starts[i], ends[i]), without its newline
+        self.starts = array('q')
+        self.ends = array('q')
+        start = 0
+        while start < size:
+            end = self.data.find(b'\n', start)
+            if end == -1:
+                end = size
+            self.starts.append(start)
+            self.ends.append(end - 1 if end > start and self.data[end - 1] == ord('\r') else end)
+            start = end + 1
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, i):
+        return self.view[self.starts[i]:self.ends[i]]
+
+    def lines(self):
+        return [self.line(i) for i in range(len(self))]
+
+    def text_lines(self):
+        return [bytes(line).decode() for line in self.lines()]
+
+    def grid(self):
+        # Rectangular inputs as (view, width): view is a 2-D (rows, stride)
+        # byte view whose columns past width hold the line endings. Trailing
+        # blank lines are ignored.
+        rows = len(self)
+        while rows and self.starts[rows - 1] == self.ends[rows - 1]:
+            rows -= 1
+        if rows == 0:
+            return memoryview(b'').cast('B', (0, 0)), 0
+        width = self.ends[0] - self.starts[0]
+        stride = self.starts[1] if rows > 1 else width + 1
+        for i in range(rows):
+            if self.starts[i] != i * stride or self.ends[i] - self.starts[i] != width:
+                raise ValueError(f"{self.path} is not a rectangular grid")
+        if len(self.data) >= rows * stride:
+            buffer = self.view[:rows * stride]
+        else:
+            # The last row has no line ending; copy once to pad it
+            buffer = memoryview(bytes(self.view) + b'\n' * (rows * stride - len(self.data)))
+        return buffer.cast('B', (rows, stride)), width
+
+    def sections(self):
+        # Views of the blocks separated by blank lines
+        sections = []
+        start = None
+        for i in range(len(self)):
+            if self.starts[i] == self.ends[i]:
+                if start is not None:
+                    sections.append(self.view[self.starts[start]:self.ends[i - 1]])
+                    start = None
+            elif start is None:
+                start = i
+        if start is not None:
+            sections.append(self.view[self.starts[start]:self.ends[len(self) - 1]])
+        return sections
+
+    def ints(self, section=None, signed=True):
+        # Every integer field. Inputs whose ranges are written "a-b" pass
+        # signed=False so the dash isn't read as a minus sign.
+        view = self.view if section is None else self.sections()[section]
+        return array('q', map(int, re.findall(rb'-?\d+' if signed else rb'\d+', view)))
+
+
+def open_input(filename):
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    cached_file = _files.get(path)
+    if cached_file is None or cached_file[:2] != (stat.st_mtime_ns, stat.st_size):
+        _files[path] = (stat.st_mtime_ns, stat.st_size, InputFile(path))
+    return _files[path][2]
+
+
+def cached(filename, parse):
+    # parse(InputFile) is run once per file path and modification time, so
+    # part 1 and part 2 share one parse. Callers must not mutate the result.
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    key = (path, parse)
+    entry = _parsed.get(key)
+    if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+        _parsed[key] = (stat.st_mtime_ns, stat.st_size, parse(open_input(path)))
+    return _parsed[key][2]
@@ -0,0 +1,148 @@
+import functools
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# AOC_PROFILE=json prints per-phase timings and counters for every
+# instrumented entry point; cprofile adds a cProfile listing and
+# tracemalloc adds per-phase peak memory. Unset, phase() and count() cost
+# a single attribute check. The reporting modules are only imported when
+# profiling is on.
+MODE = os.environ.get('AOC_PROFILE', '')
+
+_active = None
+# [traced bytes at entry, highest traced bytes seen] for each open phase,
+# innermost last, so nested phases don't lose their outer peaks
+_peaks = []
+
+
+class Profile:
+    def __init__(self, name):
+        self.name = name
+        self.phases = {}
+        self.counters = {}
+
+    def add_phase(self, name, seconds, peak_bytes=None, calls=1):
+        stats = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stats['seconds'] += seconds
+        stats['calls'] += calls
+        if peak_bytes is not None:
+            stats['peak_bytes'] = max(stats.get('peak_bytes', 0), peak_bytes)
+
+    def report(self, total):
+        return {
+            'function': self.name,
+            'seconds': total,
+            'phases': self.phases,
+            'counters': self.counters,
+        }
+
+
+@contextmanager
+def phase(name):
+    # Time a named phase (parse, precompute, build, search, reduce) of the
+    # running entry point
+    profile = _active
+    if profile is None:
+        yield
+        return
+    frame = None
+    if MODE == 'tracemalloc':
+        import tracemalloc
+        if _peaks:
+            # reset_peak() below would drop the enclosing phase's peak so far
+            _peaks[-1][1] = max(_peaks[-1][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        frame = [tracemalloc.get_traced_memory()[0], 0]
+        _peaks.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = None
+        if frame is not None:
+            _peaks.pop()
+            highest = max(frame[1], tracemalloc.get_traced_memory()[1])
+            if _peaks:
+                _peaks[-1][1] = max(_peaks[-1][1], highest)
+            peak = highest - frame[0]
+        profile.add_phase(name, elapsed, peak)
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.counters[name] = _active.counters.get(name, 0) + n
+
+
+def collected(func, *args, **kwargs):
+    # For work run in pool workers, whose phases and counters would otherwise
+    # stay in the worker: returns (result, stats) for merge() in the parent,
+    # with stats None when profiling is off
+    global _active
+    if not MODE:
+        return func(*args, **kwargs), None
+    tracing = False
+    if MODE == 'tracemalloc':
+        import tracemalloc
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+    outer, _active = _active, Profile(func.__qualname__)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profile, _active = _active, outer
+        if tracing:
+            tracemalloc.stop()
+    return result, (profile.phases, profile.counters)
+
+
+def merge(stats):
+    # Fold a worker's collected() stats into the running entry point
+    if _active is None or stats is None:
+        return
+    phases, counters = stats
+    for name, phase_stats in phases.items():
+        _active.add_phase(name, phase_stats['seconds'], phase_stats.get('peak_bytes'), phase_stats['calls'])
+    for name, n in counters.items():
+        count(name, n)
+
+
+def instrumented(func):
+    # Collect phases and counters for one call of a day entry point and
+    # print them to stderr according to AOC_PROFILE
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _active
+        if not MODE or _active is not None:
+            return func(*args, **kwargs)
+
+        import json
+        if MODE == 'cprofile':
+            import cProfile
+            import pstats
+        if MODE == 'tracemalloc':
+            import tracemalloc
+
+        _active = Profile(func.__qualname__)
+        profiler = cProfile.Profile() if MODE == 'cprofile' else None
+        if MODE == 'tracemalloc':
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                result = profiler.runcall(func, *args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+        finally:
+            total = time.perf_counter() - start
+            profile, _active = _active, None
+            if MODE == 'tracemalloc':
+                tracemalloc.stop()
+            print(json.dumps(profile.report(total)), file=sys.stderr)
+            if profiler is not None:
+                pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(20)
+        return result
+    return wrapper
@@ -0,0 +1,193 @@
+import atexit
+import functools
+import hashlib
+import os
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(ROOT, '.results.sqlite')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Set AOC_NO_CACHE=1 to always recompute
+ENABLED = not os.environ.get('AOC_NO_CACHE')
+
+_source_hashes = {}
+_cache = None
+
+
+class ResultCache:
+    # Pickled results in SQLite, evicting least recently used entries once
+    # the stored values exceed max_bytes
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        # sqlite3 and pickle are imported on first use so that importing a
+        # day module doesn't pay for them
+        import sqlite3
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value BLOB, size INTEGER, used REAL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+        self.total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        # key -> last use, written back in one transaction by flush()
+        self.touched = {}
+        atexit.register(self.flush)
+
+    def get(self, key):
+        # Returns (hit, value)
+        row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return False, None
+        import pickle
+        self.touched[key] = time.time()
+        return True, pickle.loads(row[0])
+
+    def flush(self):
+        if self.touched:
+            with self.db:
+                self.db.executemany(
+                    'UPDATE results SET used = ? WHERE key = ?',
+                    [(used, key) for key, used in self.touched.items()],
+                )
+            self.touched.clear()
+
+    def put(self, key, value):
+        import pickle
+        blob = pickle.dumps(value)
+        self.flush()
+        old = self.db.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                (key, blob, len(blob), time.time()),
+            )
+            self.total += len(blob) - (old[0] if old else 0)
+            if self.total > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        rows = self.db.execute('SELECT key, size FROM results ORDER BY used')
+        stale = []
+        for key, size in rows:
+            if self.total <= self.max_bytes:
+                break
+            stale.append((key,))
+            self.total -= size
+        self.db.executemany('DELETE FROM results WHERE key = ?', stale)
+
+
+class NullCache:
+    # Stand-in used when caching is disabled
+
+    def get(self, key):
+        return False, None
+
+    def put(self, key, value):
+        pass
+
+
+def default_cache():
+    global _cache
+    if _cache is None:
+        _cache = ResultCache() if ENABLED else NullCache()
+    return _cache
+
+
+def local_dependencies(path):
+    # path plus the repo-local files it imports or loads by name (like
+    # main-nodeps.py), and theirs in turn
+    import ast
+    found = {path}
+    pending = [path]
+    while pending:
+        current = pending.pop()
+        with open(current, 'rb') as f:
+            tree = ast.parse(f.read())
+        names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names += [alias.name.replace('.', os.sep) + '.py' for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names.append(node.module.replace('.', os.sep) + '.py')
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value.endswith('.py'):
+                names.append(node.value)
+        for name in names:
+            for folder in (os.path.dirname(current), ROOT):
+                candidate = os.path.join(folder, name)
+                if os.path.isfile(candidate) and candidate not in found:
+                    found.add(candidate)
+                    pending.append(candidate)
+    return sorted(found)
+
+
+def source_hash(func):
+    # Hash of the file defining func and the local modules it depends on
+    # (inputs.py, a main-nodeps.py it loads, ...), so editing any of them
+    # invalidates its results
+    path = os.path.abspath(func.__code__.co_filename)
+    if path not in _source_hashes:
+        digest = hashlib.sha256()
+        for dependency in local_dependencies(path):
+            with open(dependency, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        _source_hashes[path] = digest.hexdigest()
+    return _source_hashes[path]
+
+
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stable_repr(value):
+    # repr with sets sorted, since their iteration order varies between runs
+    if isinstance(value, (set, frozenset)):
+        return '{' + ', '.join(sorted(stable_repr(v) for v in value)) + '}'
+    if isinstance(value, dict):
+        return '{' + ', '.join(f"{stable_repr(k)}: {stable_repr(v)}" for k, v in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__ + '(' + ', '.join(stable_repr(v) for v in value) + ')'
+    return repr(value)
+
+
+def item_key(func, *args, **kwargs):
+    parts = [source_hash(func), func.__qualname__, stable_repr(args), stable_repr(sorted(kwargs.items()))]
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def persistent(func):
+    # For day entry points taking the input filename first: results are
+    # keyed by the input's content hash instead of its path
+    @functools.wraps(func)
+    def wrapper(filename, *args, **kwargs):
+        if not ENABLED:
+            return func(filename, *args, **kwargs)
+        key = item_key(func, file_hash(filename), *args, **kwargs)
+        hit, value = default_cache().get(key)
+        if not hit:
+            value = func(filename, *args, **kwargs)
+            default_cache().put(key, value)
+        return value
+    return wrapper
+
+
+def memoize_item(func):
+    # For per-item solvers (one machine, one region) whose arguments are
+    # plain data with a stable repr
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return func(*args, **kwargs)
+        key = item_key(func, *args, **kwargs)
+        hit, value = default_cache().get(key)
+        if not hit:
+            value = func(*args, **kwargs)
+            default_cache().put(key, value)
+        return value
+    return wrapper
@@ -0,0 +1,18 @@
+import os
+
+# abspath -> module
+_scripts = {}
+
+
+def load_script(path):
+    # Load a .py file that can't be imported by name (like a day's
+    # main-nodeps.py), once per process
+    path = os.path.abspath(path)
+    if path not in _scripts:
+        import importlib.util
+        name = os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _scripts[path] = module
+    return _scripts[path]